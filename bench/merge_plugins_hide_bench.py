@@ -0,0 +1,400 @@
+"""Benchmarks of Merge Plugins Hide on synthetic mods directories.
+
+Generates a mods directory with plain mods, merged mods with merge.json or
+*_plugins.txt metadata and plugins that are already hidden, then times the
+initial scan, the refresh and a bulk hide / unhide of all merges for each
+hide type. The engine is always measured. When PyQt6 is installed the
+dialog is measured as well, using a stub mobase module and a fake
+organizer, for example:
+
+    python bench/merge_plugins_hide_bench.py --mods 2000 --merges 100
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import importlib
+import types
+
+rootPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(rootPath, "src"))
+
+import merge_plugins_hide_engine as Me  # noqa: E402
+
+hideTypes = ["mohidden", "optional", "disable"]
+
+# Same values as common.ModState
+modStateActiveValid = 0x00000001 | 0x00000002 | 0x00000020
+
+
+def writePlugin(path, masters):
+    """Write a plugin consisting of only a TES4 record with masters."""
+    data = b"HEDR" + (12).to_bytes(2, "little") + b"\0" * 12
+    for master in masters:
+        name = master.encode("cp1252") + b"\0"
+        data += b"MAST" + len(name).to_bytes(2, "little") + name
+        data += b"DATA" + (8).to_bytes(2, "little") + b"\0" * 8
+    with open(path, "wb") as file:
+        file.write(b"TES4" + len(data).to_bytes(4, "little") + b"\0" * 16 + data)
+
+
+def generate(path, args):
+    """Generate mods, merges and a profile, returns {mod name: plugins}."""
+    rng = random.Random(args.seed)
+    modsPath = os.path.join(path, "mods")
+    modPlugins = {}
+    for i in range(args.mods):
+        modName = "Mod {:05d}".format(i)
+        modPath = os.path.join(modsPath, modName)
+        os.makedirs(modPath)
+        for j in range(args.plugins):
+            plugin = "Mod{:05d}_{}.esp".format(i, j)
+            writePlugin(os.path.join(modPath, plugin), ["Skyrim.esm"])
+            modPlugins.setdefault(modName, []).append(plugin)
+
+    plugins = [
+        (modName, plugin) for modName, names in modPlugins.items() for plugin in names
+    ]
+    rng.shuffle(plugins)
+    for i in range(args.merges):
+        merged = plugins[i * args.merge_size : (i + 1) * args.merge_size]
+        if not merged:
+            break
+        modName = "Merge {:04d}".format(i)
+        metadataPath = os.path.join(modsPath, modName, "merge - " + modName)
+        os.makedirs(metadataPath)
+        writePlugin(
+            os.path.join(modsPath, modName, "Merge{:04d}.esp".format(i)), ["Skyrim.esm"]
+        )
+        if rng.random() < args.plugins_txt:
+            with open(
+                os.path.join(metadataPath, "merge_plugins.txt"), "w", encoding="utf-8"
+            ) as file:
+                file.write("\n".join(plugin for _, plugin in merged))
+        else:
+            with open(
+                os.path.join(metadataPath, "merge.json"), "w", encoding="utf-8"
+            ) as file:
+                json.dump({"plugins": [{"filename": p} for _, p in merged]}, file)
+
+        # Hide some merges already, as left behind by earlier runs
+        location = rng.choices(
+            ["mohidden", "optional", ""],
+            [args.mohidden, args.optional, max(0, 1 - args.mohidden - args.optional)],
+        )[0]
+        for pluginModName, plugin in merged:
+            pluginModPath = os.path.join(modsPath, pluginModName)
+            if location == "optional":
+                os.makedirs(os.path.join(pluginModPath, "optional"), exist_ok=True)
+            os.rename(
+                os.path.join(pluginModPath, plugin),
+                Me.getPluginPath(pluginModPath, plugin, location),
+            )
+
+    # A few plugins depending on merged plugins, to exercise the headers
+    for modName, plugin in plugins[: args.dependents]:
+        masters = [p for _, p in rng.sample(plugins, min(3, len(plugins)))]
+        modPath = os.path.join(modsPath, modName)
+        for location in ["", "mohidden", "optional"]:
+            if os.path.exists(Me.getPluginPath(modPath, plugin, location)):
+                writePlugin(Me.getPluginPath(modPath, plugin, location), masters)
+
+    os.makedirs(os.path.join(path, "profile"))
+    os.makedirs(os.path.join(path, "overwrite"))
+    with open(
+        os.path.join(path, "profile", "modlist.txt"), "w", encoding="utf-8"
+    ) as file:
+        for modName in sorted(os.listdir(modsPath)):
+            file.write("+{}\n".format(modName))
+    return modPlugins
+
+
+class Timer:
+    def __init__(self, results, hideType, target):
+        self.__results = results
+        self.__hideType = hideType
+        self.__target = target
+
+    def __call__(self, step, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        self.__results.append(
+            {
+                "target": self.__target,
+                "hide-type": self.__hideType,
+                "step": step,
+                "seconds": elapsed,
+            }
+        )
+        return result
+
+
+def benchEngine(path, hideType, results):
+    timer = Timer(results, hideType, "engine")
+    dataPath = os.path.join(path, "data")
+    indexPath, journalPath, headersPath = Me.getDataPaths(dataPath)
+    pluginStates = {}
+
+    def createHider():
+        pluginIndex = Me.PluginIndex(indexPath)
+        pluginIndex.load()
+        headerCache = Me.PluginHeaderCache(headersPath)
+        headerCache.load()
+        hider = Me.PluginHider(
+            hideType, pluginIndex, journalPath, lambda: pluginStates, headerCache
+        )
+        for name, enabled in Me.readModList(os.path.join(path, "profile")):
+            hider.addMod(os.path.join(path, "mods", name), name, enabled, True, True)
+        hider.addMod(os.path.join(path, "overwrite"), None, True, True, False)
+        return hider, pluginIndex, headerCache
+
+    def scan():
+        hider, pluginIndex, headerCache = createHider()
+        hider.scan()
+        hider.getMergedModsDependents()
+        pluginIndex.save()
+        headerCache.save()
+        return hider
+
+    hider = timer("scan (cold)", scan)
+    hider = timer("scan (warm)", scan)
+
+    def refresh():
+        hider.invalidatePluginStates()
+        hider.getMergedModsPluginsStates()
+        hider.getMergedModsDependents()
+
+    timer("refresh", refresh)
+
+    modNames = hider.getMergedModNames()
+    if hideType == "disable":
+        # Without MO2 the plugin list is a plain dict
+        def setActive(active):
+            state = Me.PluginState.ACTIVE if active else Me.PluginState.INACTIVE
+            for modName in modNames:
+                for plugin in hider.getMergedModPlugins(modName):
+                    pluginStates[Me.pluginKey(plugin)] = state
+            hider.invalidatePluginStates()
+            hider.getMergedModsPluginsStates()
+
+    else:
+
+        def setActive(active):
+            success, _, changed, _ = hider.setMergedModsPluginsActive(modNames, active)
+            hider.getMergedModsPluginsStates(hider.invalidatePluginStates(changed))
+            if not success:
+                raise RuntimeError("Renames failed")
+
+    timer("hide all", setActive, False)
+    timer("unhide all", setActive, True)
+
+
+def createMobaseStub():
+    """Return a mobase module with just enough for the plugins to import."""
+
+    class Stub:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __getattr__(self, name):
+            return Stub()
+
+    mobase = types.ModuleType("mobase")
+    mobase.__getattr__ = lambda name: Stub
+    return mobase
+
+
+class FakeMod:
+    def __init__(self, name, path):
+        self.__name = name
+        self.__path = path
+
+    def name(self):
+        return self.__name
+
+    def absolutePath(self):
+        return self.__path
+
+
+class FakeModList:
+    def __init__(self, modsPath, modNames):
+        self.__mods = {
+            modName: FakeMod(modName, os.path.join(modsPath, modName))
+            for modName in modNames
+        }
+
+    def allMods(self):
+        return list(self.__mods)
+
+    def getMod(self, name):
+        return self.__mods[name]
+
+    def state(self, name):
+        return modStateActiveValid
+
+
+class FakePluginList:
+    def __init__(self, pluginNames):
+        self.__states = {name: Me.PluginState.ACTIVE for name in pluginNames}
+
+    def pluginNames(self):
+        return list(self.__states)
+
+    def state(self, name):
+        return self.__states.get(name, Me.PluginState.MISSING)
+
+    def setState(self, name, state):
+        self.__states[name] = state
+
+
+class FakeOrganizer:
+    """The parts of mobase.IOrganizer used by Merge Plugins Hide."""
+
+    def __init__(self, path, hideType, modPlugins):
+        modNames = sorted(os.listdir(os.path.join(path, "mods")))
+        self.__path = path
+        self.__settings = {"hide-type": hideType, "only-active-mods": True}
+        self.__modList = FakeModList(os.path.join(path, "mods"), modNames)
+        self.__pluginList = FakePluginList(
+            [plugin for plugins in modPlugins.values() for plugin in plugins]
+        )
+
+    def pluginSetting(self, pluginName, key):
+        return self.__settings[key]
+
+    def getPluginDataPath(self):
+        return os.path.join(self.__path, "data")
+
+    def overwritePath(self):
+        return os.path.join(self.__path, "overwrite")
+
+    def modList(self):
+        return self.__modList
+
+    def pluginList(self):
+        return self.__pluginList
+
+    def refresh(self):
+        pass
+
+
+class FakeTool:
+    def name(self):
+        return "Merge Plugins Hide"
+
+
+def benchDialog(path, hideType, modPlugins, results):
+    from PyQt6.QtWidgets import QApplication  # type: ignore
+
+    package = importlib.import_module("src.merge_plugins_hide")
+    app = QApplication.instance() or QApplication(["bench", "-platform", "offscreen"])
+    timer = Timer(results, hideType, "dialog")
+    organizer = FakeOrganizer(path, hideType, modPlugins)
+
+    def scan():
+        window = package.PluginWindow(organizer, FakeTool())
+        while window.isScanning():
+            app.processEvents()
+        return window
+
+    timer("scan (cold)", scan).done(0)
+    window = timer("scan (warm)", scan)
+    timer("refresh", window.refreshMergedModList)
+
+    modNames = [
+        window.mergedModModel.index(row, 0).data()
+        for row in range(window.mergedModModel.rowCount())
+    ]
+
+    def setActive(active):
+        window.refreshMergedModListPlugins(
+            window.setMergedModsPluginsActive(modNames, active)
+        )
+
+    timer("hide all", setActive, False)
+    timer("unhide all", setActive, True)
+    window.done(0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mods", type=int, default=1000, help="Number of mods")
+    parser.add_argument("--plugins", type=int, default=2, help="Plugins per mod")
+    parser.add_argument("--merges", type=int, default=50, help="Number of merges")
+    parser.add_argument("--merge-size", type=int, default=20, help="Plugins per merge")
+    parser.add_argument(
+        "--plugins-txt",
+        type=float,
+        default=0.5,
+        help="Fraction of merges with *_plugins.txt instead of merge.json",
+    )
+    parser.add_argument(
+        "--mohidden", type=float, default=0.2, help="Fraction of merges hidden"
+    )
+    parser.add_argument(
+        "--optional",
+        type=float,
+        default=0.2,
+        help="Fraction of merges moved to optional",
+    )
+    parser.add_argument(
+        "--dependents",
+        type=int,
+        default=100,
+        help="Number of plugins with masters",
+    )
+    parser.add_argument("--hide-type", choices=hideTypes, action="append")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-dialog", action="store_true", help="Only the engine")
+    parser.add_argument("--json", action="store_true", help="Output JSON")
+    args = parser.parse_args(argv)
+
+    dialog = not args.no_dialog
+    if dialog:
+        try:
+            importlib.import_module("PyQt6.QtWidgets")
+        except ImportError:
+            print("PyQt6 is not installed, only benchmarking the engine")
+            dialog = False
+        else:
+            sys.path.insert(0, rootPath)
+            sys.modules.setdefault("mobase", createMobaseStub())
+
+    results = []
+    for hideType in args.hide_type or hideTypes:
+        for target in ["engine", "dialog"] if dialog else ["engine"]:
+            # Each run gets a fresh tree, hiding and unhiding changes it
+            path = tempfile.mkdtemp(prefix="merge_plugins_hide_bench_")
+            try:
+                modPlugins = generate(path, args)
+                if target == "engine":
+                    benchEngine(path, hideType, results)
+                else:
+                    benchDialog(path, hideType, modPlugins, results)
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for result in results:
+            print(
+                "{:<8}{:<10}{:<14}{:>10.3f}s".format(
+                    result["target"],
+                    result["hide-type"],
+                    result["step"],
+                    result["seconds"],
+                )
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
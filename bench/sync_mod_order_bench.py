@@ -0,0 +1,158 @@
+"""Benchmarks of Sync Mod Order on synthetic profiles.
+
+Generates a source profile and target profiles with shuffled mod lists and
+load orders, partly overlapping with the source and with mods and plugins
+of their own, then times parsing, the differences, a dry run, the sync and
+a second sync. The second sync must not change anything, the benchmark
+fails when it does, for example:
+
+    python bench/sync_mod_order_bench.py --mods 5000 --profiles 20
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+rootPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(rootPath, "src"))
+
+import sync_mod_order_engine as Se  # noqa: E402
+import sync_mod_order_backups as Sb  # noqa: E402
+
+
+def writeLines(path, lines):
+    with open(path, "w", encoding="utf-8") as file:
+        file.writelines(line + "\n" for line in lines)
+
+
+def generate(path, args):
+    """Generate the profiles, returns (source path, {name: target path})."""
+    rng = random.Random(args.seed)
+    mods = ["Mod {:05d}".format(i) for i in range(args.mods)]
+    plugins = ["Mod{:05d}.esp".format(i) for i in range(args.mods)]
+
+    def writeProfile(profilePath, mods, plugins):
+        os.makedirs(profilePath)
+        writeLines(
+            os.path.join(profilePath, "modlist.txt"),
+            [rng.choice("+-") + mod for mod in mods],
+        )
+        pluginLines = [rng.choice(["*", ""]) + plugin for plugin in plugins]
+        writeLines(os.path.join(profilePath, "plugins.txt"), pluginLines)
+        writeLines(os.path.join(profilePath, "loadorder.txt"), plugins)
+
+    sourcePath = os.path.join(path, "Source")
+    writeProfile(sourcePath, mods, plugins)
+    targetPaths = {}
+    for i in range(args.profiles):
+        targetName = "Target {:03d}".format(i)
+        targetPaths[targetName] = os.path.join(path, targetName)
+        targetMods = [mod for mod in mods if rng.random() < args.overlap] + [
+            "Own {:03d} {:05d}".format(i, j) for j in range(int(args.mods * args.own))
+        ]
+        targetPlugins = [
+            plugin for plugin in plugins if rng.random() < args.overlap
+        ] + [
+            "Own{:03d}_{:05d}.esp".format(i, j)
+            for j in range(int(args.mods * args.own))
+        ]
+        rng.shuffle(targetMods)
+        rng.shuffle(targetPlugins)
+        writeProfile(targetPaths[targetName], targetMods, targetPlugins)
+    return sourcePath, targetPaths
+
+
+class Timer:
+    def __init__(self, results):
+        self.__results = results
+
+    def __call__(self, step, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        self.__results.append({"step": step, "seconds": elapsed})
+        return result
+
+
+def bench(path, sourcePath, targetPaths, results):
+    timer = Timer(results)
+    profileIndex = Se.ProfileIndex()
+    syncer = Se.ProfileSyncer(
+        profileIndex, Sb.BackupStore(os.path.join(path, "backups"))
+    )
+    filenames = ["modlist.txt"] + Se.loadOrderFiles
+
+    def parse():
+        syncer.setSource(sourcePath, filenames)
+        for targetPath in targetPaths.values():
+            for filename in filenames:
+                profileIndex.getList(os.path.join(targetPath, filename))
+
+    def diff():
+        modListInfo = syncer.getListInfo("modlist.txt")
+        for targetPath in targetPaths.values():
+            _, targetModListInfo = profileIndex.getList(
+                os.path.join(targetPath, "modlist.txt")
+            )
+            Se.getModListDiff(modListInfo, targetModListInfo)
+
+    timer("parse", parse)
+    timer("parse cached", parse)
+    timer("diff", diff)
+    timer("dry run", syncer.syncProfiles, targetPaths, True)
+    timer("sync", syncer.syncProfiles, targetPaths)
+    changed, _ = timer("sync again", syncer.syncProfiles, targetPaths)
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mods", type=int, default=2000, help="Mods per profile")
+    parser.add_argument(
+        "--profiles", type=int, default=10, help="Number of target profiles"
+    )
+    parser.add_argument(
+        "--overlap",
+        type=float,
+        default=0.9,
+        help="Fraction of the source mods and plugins in each target profile",
+    )
+    parser.add_argument(
+        "--own",
+        type=float,
+        default=0.05,
+        help="Mods and plugins only in each target profile, as fraction of --mods",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Output JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    path = tempfile.mkdtemp(prefix="sync_mod_order_bench_")
+    try:
+        sourcePath, targetPaths = generate(path, args)
+        changed = bench(path, sourcePath, targetPaths, results)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for result in results:
+            print("{:<16}{:>10.3f}s".format(result["step"], result["seconds"]))
+    if changed:
+        sys.stderr.write(
+            "Syncing again changed {}\n".format(", ".join(sorted(changed)))
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -34,8 +34,13 @@ def cli(target: str, zip: bool):
         shutil.rmtree(paths["out"])
     os.makedirs(paths["out"])
 
-    for file in ["common.py", f"{plugin}.py"]:
-        shutil.copy2(path.join(paths["src"], file), paths["out"])
+    # Copy the plugin together with its companion modules ({plugin}_*.py)
+    for file in os.listdir(paths["src"]):
+        if file == "common.py" or (
+            file.endswith(".py")
+            and (file == f"{plugin}.py" or file.startswith(f"{plugin}_"))
+        ):
+            shutil.copy2(path.join(paths["src"], file), paths["out"])
 
     with open(path.join(paths["src"], "plugin.__init__.py"), "r") as file:
         with open(path.join(paths["out"], "__init__.py"), "w") as out_file:
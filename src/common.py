@@ -150,5 +150,24 @@ def setPluginStateByName(organizer, name, state):
     return organizer.pluginList().setState(name, state)
 
 
+def getPluginStates(organizer):
+    """Read the state of every plugin at once, keyed by casefolded name."""
+    pluginList = organizer.pluginList()
+    return {
+        name.casefold(): PluginState(pluginList.state(name))
+        for name in pluginList.pluginNames()
+    }
+
+
+def setPluginStates(organizer, states):
+    """Set the state of each plugin in {name: state}, once per name ignoring case."""
+    pluginList = organizer.pluginList()
+    applied = set()
+    for name, state in states.items():
+        if name.casefold() not in applied:
+            applied.add(name.casefold())
+            pluginList.setState(name, state)
+
+
 def getMods(organizer):
     return [getModByName(organizer, modname) for modname in getModNames(organizer)]
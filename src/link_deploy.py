@@ -1,12 +1,17 @@
 import os
+import sys
+import stat
+import ctypes
 import datetime
 import functools
 import multiprocessing
 import concurrent.futures
 import pathlib
+import threading
 from typing import Dict, Generator, List, Optional
 
 import mobase  # type: ignore
+from .link_deploy_manifest import Manifest, getManifestPath
 
 import PyQt6.QtGui as QtGui  # type: ignore
 
@@ -14,13 +19,13 @@ from PyQt6.QtCore import qInfo  # type: ignore
 
 import PyQt6.QtWidgets as QtWidgets  # type: ignore
 
-
 QFramePanel = QtWidgets.QFrame.Shape.Panel
 QFrameSunken = QtWidgets.QFrame.Shadow.Sunken
 
 from PyQt6.QtCore import (  # type: ignore
     Qt,
     QThread,
+    QTimer,
     pyqtSignal,
     qWarning,
     QCoreApplication,
@@ -35,6 +40,147 @@ class FileEntry:
     def __init__(self, filepath: str, filetreeentry: mobase.FileTreeEntry = None):
         self.filepath = filepath
         self.filetreeentry = filetreeentry
+        self.origin: Optional[str] = None
+
+
+class StatCache:
+    """Per-deploy cache of file stats fed by directory scans.
+
+    The first lookup of a path scans its parent directory once with
+    `os.scandir` and records every entry found, so later lookups of siblings
+    do not hit the file system again. Paths written by the deploy itself
+    must be passed to `invalidate`.
+    """
+
+    __UNKNOWN = object()
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__entries: Dict[str, object] = {}
+        self.__stats: Dict[str, os.stat_result] = {}
+        self.__scanned: set = set()
+
+    @staticmethod
+    def __key(path: str) -> str:
+        return os.path.normcase(os.path.normpath(path))
+
+    def __scan(self, dirkey: str) -> None:
+        entries: Dict[str, object] = {}
+        try:
+            with os.scandir(dirkey) as it:
+                for direntry in it:
+                    try:
+                        entries[self.__key(direntry.path)] = direntry.stat()
+                    except OSError:
+                        # Dangling link, same as os.path.exists
+                        entries[self.__key(direntry.path)] = None
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        except OSError:
+            # Unreadable, paths in it are looked up one by one
+            return
+        with self.__lock:
+            for key, value in entries.items():
+                self.__entries.setdefault(key, value)
+            self.__scanned.add(dirkey)
+
+    def lookup(self, path: str) -> Optional[os.stat_result]:
+        """Return the (scandir) stat of a path or None if it does not exist."""
+        key = self.__key(path)
+        dirkey = os.path.dirname(key)
+        # Paths missing from a scanned directory do not exist, only
+        # invalidated paths and paths in unreadable directories are stat'ed
+        with self.__lock:
+            scanned = dirkey in self.__scanned
+            value = self.__entries.get(key, None if scanned else self.__UNKNOWN)
+        if value is self.__UNKNOWN and not scanned:
+            self.__scan(dirkey)
+            with self.__lock:
+                scanned = dirkey in self.__scanned
+                value = self.__entries.get(key, None if scanned else self.__UNKNOWN)
+        if value is self.__UNKNOWN:
+            try:
+                value = os.stat(key)
+            except OSError:
+                value = None
+            with self.__lock:
+                self.__entries[key] = value
+        return value
+
+    def exists(self, path: str) -> bool:
+        return self.lookup(path) is not None
+
+    def isdir(self, path: str) -> bool:
+        result = self.lookup(path)
+        return result is not None and stat.S_ISDIR(result.st_mode)
+
+    def stat(self, path: str) -> os.stat_result:
+        """Return a full stat of a path, raising OSError if it does not exist.
+
+        Unlike the scandir results this includes st_dev and st_ino on Windows.
+        """
+        key = self.__key(path)
+        with self.__lock:
+            result = self.__stats.get(key)
+        if result is None:
+            if not self.exists(key):
+                raise FileNotFoundError(path)
+            result = os.stat(key)
+            with self.__lock:
+                self.__stats[key] = result
+        return result
+
+    def samefile(self, path1: str, path2: str) -> bool:
+        return os.path.samestat(self.stat(path1), self.stat(path2))
+
+    def invalidate(self, path: str) -> None:
+        key = self.__key(path)
+        with self.__lock:
+            self.__entries[key] = self.__UNKNOWN
+            self.__stats.pop(key, None)
+
+    def makedirs(self, path: str) -> None:
+        if self.isdir(path):
+            return
+        os.makedirs(path, exist_ok=True)
+        # Parents may have been created as well
+        parent = os.path.normpath(path)
+        while True:
+            self.invalidate(parent)
+            if os.path.dirname(parent) == parent:
+                break
+            parent = os.path.dirname(parent)
+
+
+THREAD_PRIORITY_BELOW_NORMAL = -1
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+
+
+def lowerThreadPriority(low_io: bool, low_cpu: bool) -> None:
+    """Lower the I/O and/or CPU priority of the calling thread."""
+    try:
+        if sys.platform == "win32":
+            kernel32 = ctypes.windll.kernel32
+            if low_io:
+                # Background mode lowers I/O, memory and CPU priority
+                kernel32.SetThreadPriority(
+                    kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN
+                )
+            elif low_cpu:
+                kernel32.SetThreadPriority(
+                    kernel32.GetCurrentThread(), THREAD_PRIORITY_BELOW_NORMAL
+                )
+        elif low_cpu or low_io:
+            # Only niceness is available here, it applies per thread on Linux
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except Exception as e:
+        qWarning(
+            QCoreApplication.translate(
+                "LinkDeployWorker", "Could not lower thread priority: {}"
+            )
+            .format(str(e))
+            .encode("utf-8")
+        )
 
 
 def isRelativeTo(from_path: pathlib.Path, to_path: pathlib.Path) -> bool:
@@ -57,6 +203,7 @@ def listDirectoriesRecursive(
 
 def generateEntries(
     organizer: mobase.IOrganizer,
+    stat_cache: StatCache,
 ) -> Generator[FileEntry, None, None]:
     mods_directory = organizer.modsPath()
     overwrite_directory = organizer.overwritePath()
@@ -64,7 +211,7 @@ def generateEntries(
 
     for dirpath in listDirectoriesRecursive(organizer):
         for filepath in organizer.findFiles(path=dirpath, filter=lambda x: True):
-            if "mohidden" in filepath or not os.path.exists(filepath):
+            if "mohidden" in filepath or not stat_cache.exists(filepath):
                 continue
 
             p = pathlib.Path(filepath)
@@ -86,7 +233,7 @@ def generateEntries(
 
 
 class DeployWorker(QThread):
-    finish_signal = pyqtSignal()
+    finish_signal = pyqtSignal(bool)
     message_signal = pyqtSignal(dict)
 
     def __tr(self, text: str) -> str:
@@ -99,31 +246,52 @@ class DeployWorker(QThread):
         gameTargetDir: str,
         symlink: bool,
         redirect_root: bool,
-        entries_generator: Generator[Dict[str, str], None, None],
+        entries_generator: Generator[FileEntry, None, None],
+        stat_cache: StatCache,
+        manifest: Manifest,
+        low_io_priority: bool = False,
+        low_cpu_priority: bool = False,
         parent: Optional[QtWidgets.QWidget] = None,
     ) -> None:
         super().__init__(parent)
         self.__is_running = True
         self.__entries_generator = entries_generator
+        self.__stat_cache = stat_cache
+        self.__manifest = manifest
         self.__symlink = symlink
         self.__organizer = organizer
         self.__data_target_dir = dataTargetDir
         self.__game_target_dir = gameTargetDir
         self.__redirect_root = redirect_root
+        self.__low_io_priority = low_io_priority
+        self.__low_cpu_priority = low_cpu_priority
         self.__max_workers = min(4, max(1, multiprocessing.cpu_count() - 1))
 
     def run(self) -> None:
-        def link_task(entry: Dict[str, str]) -> Dict[str, str]:
+        lowerThreadPriority(self.__low_io_priority, self.__low_cpu_priority)
+
+        def create_link(source_path: str, target_path: str) -> None:
+            try:
+                if self.__symlink:
+                    os.symlink(source_path, target_path)
+                else:
+                    os.link(source_path, target_path)
+            finally:
+                self.__stat_cache.invalidate(target_path)
+
+        def link_task(entry: FileEntry) -> Dict[str, object]:
             if not self.__is_running:
                 return {"entry": entry, "status": "canceled"}
 
-            origins = self.__organizer.getFileOrigins(entry["filepath"])
-            if not origins[0]:
+            origins = self.__organizer.getFileOrigins(entry.filepath)
+            if not origins:
                 qWarning(self.__tr("No origins found").encode("utf-8"))
                 return {"entry": entry, "status": "failed"}
 
             origin = origins[0]
-            filepath = entry["filepath"]
+            filepath = entry.filepath
+            entry.origin = origin
+            self.__manifest.conflicts.add(filepath, origins)
             filepathsegments = filepath.split(os.sep)
 
             if "mohidden" in filepathsegments:
@@ -142,7 +310,7 @@ class DeployWorker(QThread):
                 return {"entry": entry, "status": "failed"}
 
             source_path = os.path.join(mod.absolutePath(), filepath)
-            if not os.path.exists(source_path):
+            if not self.__stat_cache.exists(source_path):
                 qWarning(
                     self.__tr("Source path {} does not exist")
                     .format(source_path)
@@ -151,7 +319,7 @@ class DeployWorker(QThread):
                 return {"entry": entry, "status": "failed"}
 
             try:
-                os.makedirs(target_dirpath, exist_ok=True)
+                self.__stat_cache.makedirs(target_dirpath)
             except Exception as e:
                 qWarning(
                     self.__tr("Could not create path {}: {}")
@@ -161,16 +329,13 @@ class DeployWorker(QThread):
                 return {"entry": entry, "status": "failed"}
 
             try:
-                if self.__symlink:
-                    os.symlink(source_path, target_path)
-                else:
-                    os.link(source_path, target_path)
+                create_link(source_path, target_path)
                 return {"entry": entry, "status": "linked"}
             except FileExistsError:
-                if not os.path.samefile(source_path, target_path):
+                if not self.__stat_cache.samefile(source_path, target_path):
                     backup_path = (
                         target_path + ".mo2_original"
-                        if not os.path.exists(target_path + ".mo2_original")
+                        if not self.__stat_cache.exists(target_path + ".mo2_original")
                         else target_path
                         + ".mo2_"
                         + datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
@@ -184,12 +349,12 @@ class DeployWorker(QThread):
                             .encode("utf-8")
                         )
                         return {"entry": entry, "status": "failed"}
+                    finally:
+                        self.__stat_cache.invalidate(target_path)
+                        self.__stat_cache.invalidate(backup_path)
 
                     try:
-                        if self.__symlink:
-                            os.symlink(source_path, target_path)
-                        else:
-                            os.link(source_path, target_path)
+                        create_link(source_path, target_path)
                         return {"entry": entry, "status": "linked"}
                     except Exception as e:
                         qWarning(
@@ -209,12 +374,16 @@ class DeployWorker(QThread):
                 return {"entry": entry, "status": "failed"}
 
         def link_done_callback(
-            entry: Dict[str, str], future: concurrent.futures.Future
+            entry: FileEntry, future: concurrent.futures.Future
         ) -> None:
-            self.message_signal.emit(future.result())
+            result = future.result()
+            self.__manifest.record(entry.filepath, entry.origin, result["status"])
+            self.message_signal.emit(result)
 
         with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.__max_workers
+            max_workers=self.__max_workers,
+            initializer=lowerThreadPriority,
+            initargs=(self.__low_io_priority, self.__low_cpu_priority),
         ) as executor:
             for entry in self.__entries_generator:
                 if not self.__is_running:
@@ -222,7 +391,19 @@ class DeployWorker(QThread):
                 future = executor.submit(link_task, entry)
                 future.add_done_callback(functools.partial(link_done_callback, entry))
 
-        self.finish_signal.emit()
+        # A canceled deploy keeps the manifest of the last complete deploy
+        completed = self.__is_running
+        if completed:
+            try:
+                self.__manifest.save()
+            except Exception as e:
+                qWarning(
+                    self.__tr("Could not save manifest {}: {}")
+                    .format(self.__manifest.path, str(e))
+                    .encode("utf-8")
+                )
+
+        self.finish_signal.emit(completed)
 
     def stop(self) -> None:
         self.__is_running = False
@@ -241,11 +422,72 @@ class PluginWindow(QtWidgets.QDialog):
         super(PluginWindow, self).__init__(None)
 
         self.__organizer = organizer
+        self.__plugin_name = parent.name()
         self.__deploy_worker: Optional[DeployWorker] = None
-        self.__symlink = organizer.pluginSetting(parent.name(), "symlink") == "true"
+        self.__deploy_counts: Dict[str, int] = {}
+        self.__deploy_manifest = None
 
         self.init_ui()
 
+        # Reports progress while the dialog is closed during a deploy
+        self.__tray_icon = QtWidgets.QSystemTrayIcon(
+            QtGui.QIcon(":/deorder/link_deploy"), self
+        )
+        self.__tray_icon.activated.connect(self._show_window)
+        self.__tray_icon.messageClicked.connect(self._show_window)
+
+        # The icon stays visible after a deploy while its notification shows
+        self.__tray_hide_timer = QTimer(self)
+        self.__tray_hide_timer.setSingleShot(True)
+        self.__tray_hide_timer.setInterval(10000)
+        self.__tray_hide_timer.timeout.connect(self.__tray_icon.hide)
+
+        self.reset()
+
+    def reset(self) -> None:
+        """Read the settings and the manifest of the current profile again.
+
+        The window is reused between deploys, must not be called while
+        deploying.
+        """
+        self.__symlink = bool(
+            self.__organizer.pluginSetting(self.__plugin_name, "symlink")
+        )
+        self.__low_io_priority = bool(
+            self.__organizer.pluginSetting(self.__plugin_name, "low-io-priority")
+        )
+        self.__low_cpu_priority = bool(
+            self.__organizer.pluginSetting(self.__plugin_name, "low-cpu-priority")
+        )
+        self.__manifest_path = getManifestPath(
+            self.__organizer.getPluginDataPath(), self.__organizer.profileName()
+        )
+        self.__manifest = Manifest(self.__manifest_path)
+        if os.path.isfile(self.__manifest_path):
+            try:
+                self.__manifest = Manifest.load(self.__manifest_path)
+            except Exception as e:
+                qWarning(
+                    self.__tr("Could not load manifest {}: {}")
+                    .format(self.__manifest_path, str(e))
+                    .encode("utf-8")
+                )
+
+        self.__tray_hide_timer.stop()
+        self.__tray_icon.hide()
+        self.conflictList.clear()
+        self.statusLabel.setText("...")
+        self.__deployButton.setDisabled(False)
+        self.__cancelButton.setDisabled(True)
+
+    def shutdown(self) -> None:
+        """Cancel a running deploy and wait for it, before MO2 quits."""
+        if self.__deploy_worker is not None:
+            self.__deploy_worker.stop()
+            self.__deploy_worker.wait()
+        self.__tray_hide_timer.stop()
+        self.__tray_icon.hide()
+
     def init_ui(self) -> None:
         self.resize(800, 400)
         self.setWindowIcon(QtGui.QIcon(":/deorder/link_deploy"))
@@ -418,6 +660,33 @@ Note: (Un/re)deploying is not supported meaning you will have to reinstall the g
         self.redirectRootCheckbox.setChecked(True)
         vertical_layout.addWidget(self.redirectRootCheckbox)
 
+        self.conflictsLabel = QtWidgets.QLabel(self)
+        self.conflictsLabel.setText(self.__tr("Conflicts of last deploy:"))
+        vertical_layout.addWidget(self.conflictsLabel)
+
+        conflicts_layout = QtWidgets.QHBoxLayout()
+
+        self.conflictModEdit = QtWidgets.QLineEdit(self)
+        self.conflictModEdit.setPlaceholderText(self.__tr("Mod name"))
+        self.conflictModEdit.setCompleter(
+            QtWidgets.QCompleter(self.__organizer.modList().allMods(), self)
+        )
+        self.conflictModEdit.returnPressed.connect(self._show_lost)
+        conflicts_layout.addWidget(self.conflictModEdit)
+
+        lostButton = QtWidgets.QPushButton(self.__tr("Files &lost"), self)
+        lostButton.clicked.connect(self._show_lost)
+        conflicts_layout.addWidget(lostButton)
+
+        wonButton = QtWidgets.QPushButton(self.__tr("Files &won"), self)
+        wonButton.clicked.connect(self._show_won)
+        conflicts_layout.addWidget(wonButton)
+
+        vertical_layout.addLayout(conflicts_layout)
+
+        self.conflictList = QtWidgets.QListWidget(self)
+        vertical_layout.addWidget(self.conflictList)
+
         self.statusLabel = QtWidgets.QLabel(self)
         self.statusLabel.setFrameStyle(QFramePanel | QFrameSunken)
         self.statusLabel.setText("...")
@@ -430,6 +699,12 @@ Note: (Un/re)deploying is not supported meaning you will have to reinstall the g
         self.__deployButton.clicked.connect(self._deploy)
         button_layout.addWidget(self.__deployButton)
 
+        self.__cancelButton = QtWidgets.QPushButton(self.__tr("C&ancel"), self)
+        self.__cancelButton.setIcon(QtGui.QIcon(":/MO/gui/remove"))
+        self.__cancelButton.setDisabled(True)
+        self.__cancelButton.clicked.connect(self._cancel)
+        button_layout.addWidget(self.__cancelButton)
+
         closeButton = QtWidgets.QPushButton(self.__tr("&Close"), self)
         closeButton.clicked.connect(self._close)
         button_layout.addWidget(closeButton)
@@ -439,50 +714,147 @@ Note: (Un/re)deploying is not supported meaning you will have to reinstall the g
 
     def _deploy(self) -> None:
         self.statusLabel.setText(self.__tr("Deploying links. Please wait..."))
+        self.__deployButton.setDisabled(True)
+        self.__cancelButton.setDisabled(False)
+        self.__deploy_counts = {"processed": 0, "linked": 0, "failed": 0}
+
+        stat_cache = StatCache()
+        entries_generator = generateEntries(self.__organizer, stat_cache)
+
+        # Queries keep using the last complete deploy until this one completes
+        self.__deploy_manifest = Manifest(
+            self.__manifest_path,
+            {
+                "profile": self.__organizer.profileName(),
+                "data_target_dir": self.dataTargetDirEdit.text(),
+                "game_target_dir": self.gameTargetDirEdit.text(),
+                "symlink": self.__symlink,
+                "redirect_root": self.redirectRootCheckbox.isChecked(),
+            },
+        )
 
-        entries_generator = generateEntries(self.__organizer)
-
-        for entry in entries_generator:
-            qInfo(
-                QCoreApplication.translate("LinkDeploy", "Found file {}/{}")
-                .format(entry.filepath, entry.filetreeentry.path())
-                .encode("utf-8")
-            )
+        self.__deploy_worker = DeployWorker(
+            self.__organizer,
+            self.dataTargetDirEdit.text(),
+            self.gameTargetDirEdit.text(),
+            self.__symlink,
+            self.redirectRootCheckbox.isChecked(),
+            entries_generator,
+            stat_cache,
+            self.__deploy_manifest,
+            self.__low_io_priority,
+            self.__low_cpu_priority,
+            self,
+        )
 
-        # self.__deploy_worker = DeployWorker(
-        #     self.__organizer,
-        #     self.dataTargetDirEdit.text(),
-        #     self.gameTargetDirEdit.text(),
-        #     self.__symlink,
-        #     self.redirectRootCheckbox.isChecked(),
-        #     entries_generator,
-        #     self,
-        # )
+        self.__deploy_worker.message_signal.connect(self._message_handler)
+        self.__deploy_worker.finish_signal.connect(self._finish_handler)
 
-        # self.__deploy_worker.message_signal.connect(self._message_handler)
-        # self.__deploy_worker.finish_signal.connect(self._finish_handler)
+        self.__deploy_worker.start()
 
-        # self.__deploy_worker.start()
+        self.__tray_hide_timer.stop()
+        self.__tray_icon.setToolTip(self.__tr("Link Deploy: starting"))
+        self.__tray_icon.show()
 
-    def _message_handler(self, result: Dict[str, str]) -> None:
+    def _message_handler(self, result: Dict[str, object]) -> None:
         entry = result["entry"]
         status = result["status"]
-        filepath = entry["filepath"]
-        self.statusLabel.setText(self.__tr("{} {}").format(filepath, self.__tr(status)))
+        filepath = entry.filepath
+        self.__deploy_counts["processed"] += 1
+        if status in self.__deploy_counts:
+            self.__deploy_counts[status] += 1
+        progress = self.__tr("{} files processed, {} linked, {} failed").format(
+            self.__deploy_counts["processed"],
+            self.__deploy_counts["linked"],
+            self.__deploy_counts["failed"],
+        )
+        self.statusLabel.setText(
+            "{}\n{} {}".format(progress, filepath, self.__tr(status))
+        )
+        self.__tray_icon.setToolTip(self.__tr("Link Deploy: {}").format(progress))
         if status == "failed":
             qWarning(self.__tr("Failed linking: {}").format(filepath).encode("utf-8"))
         if status == "skipped":
             qInfo(self.__tr("Skipped linking: {}").format(filepath).encode("utf-8"))
 
-    def _finish_handler(self) -> None:
-        self.statusLabel.setText(self.__tr("Finished deployment."))
+    def _finish_handler(self, completed: bool) -> None:
+        if completed:
+            self.__manifest = self.__deploy_manifest
+            message = self.__tr(
+                "Finished deployment, {} files linked, {} failed, {} conflicting files."
+            ).format(
+                self.__deploy_counts.get("linked", 0),
+                self.__deploy_counts.get("failed", 0),
+                len(self.__manifest.conflicts),
+            )
+        else:
+            message = self.__tr(
+                "Canceled deployment, {} files linked, {} failed."
+            ).format(
+                self.__deploy_counts.get("linked", 0),
+                self.__deploy_counts.get("failed", 0),
+            )
+        self.__deploy_manifest = None
+        self.statusLabel.setText(message)
         self.__deployButton.setDisabled(True)
+        self.__cancelButton.setDisabled(True)
+        if self.isVisible():
+            self.__tray_icon.hide()
+        else:
+            self.__tray_icon.setToolTip(self.__tr("Link Deploy: {}").format(message))
+            self.__tray_icon.showMessage(self.__tr("Link Deploy"), message)
+            self.__tray_hide_timer.start()
+        self.__deploy_worker = None
+
+    def is_deploying(self) -> bool:
+        return self.__deploy_worker is not None and self.__deploy_worker.isRunning()
+
+    def _show_window(self) -> None:
+        if not self.is_deploying():
+            self.__tray_hide_timer.stop()
+            self.__tray_icon.hide()
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
+    def _show_conflicts_summary(self, mod_name: str) -> None:
+        counts = self.__manifest.conflicts.counts(mod_name)
+        self.statusLabel.setText(
+            self.__tr("{} overwrites {} files and is overwritten in {} files").format(
+                mod_name, counts["overwriting"], counts["overwritten"]
+            )
+        )
 
-    def _close(self) -> None:
+    def _show_lost(self) -> None:
+        mod_name = self.conflictModEdit.text()
+        self.conflictList.clear()
+        self.conflictList.addItems(
+            [
+                self.__tr("{} (won by {})").format(filepath, winner)
+                for filepath, winner in self.__manifest.conflicts.lost(mod_name)
+            ]
+        )
+        self._show_conflicts_summary(mod_name)
+
+    def _show_won(self) -> None:
+        mod_name = self.conflictModEdit.text()
+        self.conflictList.clear()
+        self.conflictList.addItems(
+            [
+                self.__tr("{} (overwrites {})").format(filepath, ", ".join(losers))
+                for filepath, losers in self.__manifest.conflicts.won(mod_name)
+            ]
+        )
+        self._show_conflicts_summary(mod_name)
+
+    def _cancel(self) -> None:
         if self.__deploy_worker:
+            self.statusLabel.setText(self.__tr("Canceling deployment..."))
+            self.__cancelButton.setDisabled(True)
             self.__deploy_worker.stop()
-            self.__deploy_worker.quit()
-            self.__deploy_worker.wait()
+
+    def _close(self) -> None:
+        # A running deploy keeps going in the background, see PluginTool.display
         self.close()
 
 
@@ -502,8 +874,14 @@ class PluginTool(mobase.IPluginTool):
         from . import resources  # noqa
 
         self.__organizer = organizer
+        # A deploy thread must not be running when Qt tears down
+        QCoreApplication.instance().aboutToQuit.connect(self.__shutdown)
         return bool(self.__organizer.pluginSetting(self.NAME, "agree"))
 
+    def __shutdown(self) -> None:
+        if self.__window is not None:
+            self.__window.shutdown()
+
     def settings(self) -> List[mobase.PluginSetting]:
         return [
             mobase.PluginSetting("enabled", self.__tr("Enable plugin"), False),
@@ -519,12 +897,30 @@ class PluginTool(mobase.IPluginTool):
                 self.__tr("Use symlinks/softlinks instead of hardlinks"),
                 False,
             ),
+            mobase.PluginSetting(
+                "low-io-priority",
+                self.__tr("Deploy with background (low) I/O priority"),
+                False,
+            ),
+            mobase.PluginSetting(
+                "low-cpu-priority",
+                self.__tr("Deploy with low CPU priority"),
+                False,
+            ),
         ]
 
     def display(self) -> None:
-        self.__window = PluginWindow(self.__organizer, self)
-        self.__window.setWindowTitle(self.NAME)
-        self.__window.exec()
+        # The window is non-modal and only hidden when closed so a deploy can
+        # continue in the background; it is reused and reset when reopened
+        # after a deploy
+        if self.__window is None:
+            self.__window = PluginWindow(self.__organizer, self)
+            self.__window.setWindowTitle(self.NAME)
+        elif not self.__window.is_deploying() and not self.__window.isVisible():
+            self.__window.reset()
+        self.__window.show()
+        self.__window.raise_()
+        self.__window.activateWindow()
 
     def icon(self) -> QtGui.QIcon:
         return QtGui.QIcon(":/deorder/link_deploy")
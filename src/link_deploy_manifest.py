@@ -0,0 +1,207 @@
+"""Record of the last Link Deploy of a profile and the conflicts it found.
+
+python link_deploy_manifest.py <manifest.json> lost "Some Mod"
+"""
+
+import os
+import sys
+import json
+import argparse
+import datetime
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def normalizePath(filepath: str) -> str:
+    """Return the key of a relative path, with / as separator and the case
+    normalized like the file system does (lower case on Windows)."""
+    return os.path.normcase(filepath).replace("\\", "/")
+
+
+class ConflictIndex:
+    """Index of every path that is provided by more than one mod.
+
+    Providers are stored in MO2 origin order, the first provider wins. Per
+    mod lookups of won and lost paths are kept alongside so queries do not
+    need to walk all paths. Safe to query while a deploy adds paths. Paths
+    are keyed by normalizePath.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__providers: Dict[str, List[str]] = {}
+        self.__winning: Dict[str, Set[str]] = {}
+        self.__losing: Dict[str, Set[str]] = {}
+
+    def add(self, filepath: str, providers: List[str]) -> None:
+        if len(providers) < 2:
+            return
+        filepath = normalizePath(filepath)
+        with self.__lock:
+            self.__remove(filepath)
+            self.__providers[filepath] = list(providers)
+            self.__winning.setdefault(providers[0], set()).add(filepath)
+            for provider in providers[1:]:
+                self.__losing.setdefault(provider, set()).add(filepath)
+
+    def __remove(self, filepath: str) -> None:
+        providers = self.__providers.pop(filepath, None)
+        if providers:
+            self.__winning.get(providers[0], set()).discard(filepath)
+            for provider in providers[1:]:
+                self.__losing.get(provider, set()).discard(filepath)
+
+    def providers(self, filepath: str) -> List[str]:
+        with self.__lock:
+            return list(self.__providers.get(normalizePath(filepath), []))
+
+    def lost(self, mod: str) -> List[Tuple[str, str]]:
+        """Return (path, winning mod) for every file the mod loses."""
+        with self.__lock:
+            lost = [
+                (filepath, self.__providers[filepath][0])
+                for filepath in self.__losing.get(mod, ())
+            ]
+        return sorted(lost)
+
+    def won(self, mod: str) -> List[Tuple[str, List[str]]]:
+        """Return (path, losing mods) for every file the mod wins."""
+        with self.__lock:
+            won = [
+                (filepath, self.__providers[filepath][1:])
+                for filepath in self.__winning.get(mod, ())
+            ]
+        return sorted(won)
+
+    def counts(self, mod: str) -> Dict[str, int]:
+        with self.__lock:
+            return {
+                "overwriting": len(self.__winning.get(mod, ())),
+                "overwritten": len(self.__losing.get(mod, ())),
+            }
+
+    def mods(self) -> List[str]:
+        with self.__lock:
+            mods = [
+                mod
+                for mod in set(self.__winning) | set(self.__losing)
+                if self.__winning.get(mod) or self.__losing.get(mod)
+            ]
+        return sorted(mods)
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__providers)
+
+    def toDict(self) -> Dict[str, List[str]]:
+        with self.__lock:
+            return dict(self.__providers)
+
+    @classmethod
+    def fromDict(cls, data: Dict[str, List[str]]) -> "ConflictIndex":
+        index = cls()
+        for filepath, providers in data.items():
+            index.add(filepath, providers)
+        return index
+
+
+class Manifest:
+    """Record of a single deploy: its targets, deployed files and conflicts."""
+
+    VERSION = 1
+
+    def __init__(self, path: str, info: Optional[Dict[str, object]] = None) -> None:
+        self.path = path
+        self.info: Dict[str, object] = dict(info or {})
+        self.files: Dict[str, Dict[str, str]] = {}
+        self.conflicts = ConflictIndex()
+        self.__lock = threading.Lock()
+
+    def record(self, filepath: str, origin: Optional[str], status: str) -> None:
+        with self.__lock:
+            self.files[filepath] = {"origin": origin or "", "status": status}
+
+    def save(self) -> None:
+        data = {
+            "version": self.VERSION,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "info": self.info,
+            "files": self.files,
+            "conflicts": self.conflicts.toDict(),
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temppath = self.path + ".tmp"
+        with open(temppath, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temppath, self.path)
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != cls.VERSION:
+            raise ValueError(
+                "Unsupported manifest version {}".format(data.get("version"))
+            )
+        manifest = cls(path, data.get("info"))
+        manifest.files = data.get("files", {})
+        manifest.conflicts = ConflictIndex.fromDict(data.get("conflicts", {}))
+        return manifest
+
+
+def getManifestPath(dataPath: str, profileName: str) -> str:
+    return os.path.join(dataPath, "link_deploy", profileName + ".json")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Query the conflict index of a Link Deploy manifest."
+    )
+    parser.add_argument("manifest", help="Path to the deploy manifest (.json)")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", help="Output JSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "summary", parents=[common], help="Overwriting/overwritten counts per mod"
+    )
+    subparsers.add_parser(
+        "lost", parents=[common], help="Files a mod loses"
+    ).add_argument("mod")
+    subparsers.add_parser(
+        "won", parents=[common], help="Files a mod wins"
+    ).add_argument("mod")
+    subparsers.add_parser(
+        "providers", parents=[common], help="Mods providing a file"
+    ).add_argument("filepath")
+    args = parser.parse_args(argv)
+
+    conflicts = Manifest.load(args.manifest).conflicts
+    if args.command == "summary":
+        result = {mod: conflicts.counts(mod) for mod in conflicts.mods()}
+        lines = [
+            "{}\t{}\t{}".format(mod, counts["overwriting"], counts["overwritten"])
+            for mod, counts in result.items()
+        ]
+    elif args.command == "lost":
+        result = conflicts.lost(args.mod)
+        lines = ["{}\t{}".format(filepath, winner) for filepath, winner in result]
+    elif args.command == "won":
+        result = conflicts.won(args.mod)
+        lines = [
+            "{}\t{}".format(filepath, ", ".join(losers)) for filepath, losers in result
+        ]
+    else:
+        result = conflicts.providers(args.filepath)
+        lines = result
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for line in lines:
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,9 @@
 import os
-import glob
-import json
 import traceback
 
 import mobase  # type: ignore
 from . import common as Dc
+from . import merge_plugins_hide_engine as Me
 
 import PyQt6.QtGui as QtGui  # type: ignore
 
@@ -17,22 +16,208 @@ QAbstractItemViewExtendedSelection = (
 )
 
 from PyQt6.QtCore import Qt, qDebug, qWarning, qCritical, QCoreApplication  # type: ignore
+from PyQt6.QtCore import QThread, QTimer, QFileSystemWatcher, pyqtSignal  # type: ignore
+from PyQt6.QtCore import QAbstractTableModel, QSortFilterProxyModel, QModelIndex  # type: ignore
 
 qtBlack = Qt.GlobalColor.black
 qtUserRole = Qt.ItemDataRole.UserRole
+qtSortRole = Qt.ItemDataRole.UserRole + 1
+qtDisplayRole = Qt.ItemDataRole.DisplayRole
+qtBackgroundRole = Qt.ItemDataRole.BackgroundRole
+qtForegroundRole = Qt.ItemDataRole.ForegroundRole
+qtDecorationRole = Qt.ItemDataRole.DecorationRole
+qtToolTipRole = Qt.ItemDataRole.ToolTipRole
+qtHorizontal = Qt.Orientation.Horizontal
+qtAscendingOrder = Qt.SortOrder.AscendingOrder
+qtCaseInsensitive = Qt.CaseSensitivity.CaseInsensitive
+QAbstractItemViewSelectRows = QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows
 qtScrollBarAlwaysOff = Qt.ScrollBarPolicy.ScrollBarAlwaysOff
 qtCustomContextMenu = Qt.ContextMenuPolicy.CustomContextMenu
 qtWindowContextHelpButtonHint = Qt.WindowType.WindowContextHelpButtonHint
 
 
+class ScanWorker(QThread):
+    """Looks up mods in the plugin index on a thread pool."""
+
+    result_signal = pyqtSignal(str, object)
+    finish_signal = pyqtSignal()
+
+    def __init__(self, pluginIndex, headerCache, modPaths, parent=None):
+        super(ScanWorker, self).__init__(parent)
+        self.__is_running = True
+        self.__pluginIndex = pluginIndex
+        self.__headerCache = headerCache
+        self.__modPaths = modPaths
+
+    def run(self):
+        pluginPaths = []
+        # Closing the generator early cancels the pending lookups
+        for modPath, entry in Me.scanMods(self.__pluginIndex, self.__modPaths):
+            if not self.__is_running:
+                break
+            self.result_signal.emit(modPath, entry)
+            pluginPaths += [
+                Me.getPluginPath(modPath, filename, location)
+                for filename, location in entry["plugins"]
+            ]
+        # Read the plugin headers here so masters are cached for the dialog
+        if self.__is_running:
+            Me.readPluginHeaders(self.__headerCache, pluginPaths)
+        self.finish_signal.emit()
+
+    def stop(self):
+        self.__is_running = False
+
+
+class MergedModListModel(QAbstractTableModel):
+    """Merged mods and their plugins state, updated row by row."""
+
+    def __tr(self, str):
+        return QCoreApplication.translate("MergePluginsHideWindow", str)
+
+    def __init__(self, parent=None):
+        super(MergedModListModel, self).__init__(parent)
+        self.__modNames = []
+        self.__rows = {}
+        self.__states = {}
+        self.__dependents = {}
+        self.__warningIcon = QtGui.QIcon(":/MO/gui/warning")
+        self.__colors = {
+            Dc.ModPluginsState.UNKNOWN: Dc.red,
+            Dc.ModPluginsState.ACTIVE: None,
+            Dc.ModPluginsState.MIXED: Dc.yellow,
+            Dc.ModPluginsState.INACTIVE: Dc.green,
+        }
+        self.__descriptions = {
+            Dc.ModPluginsState.UNKNOWN: self.__tr("Unknown"),
+            Dc.ModPluginsState.ACTIVE: self.__tr("All plugins active"),
+            Dc.ModPluginsState.MIXED: self.__tr("Some plugins active"),
+            Dc.ModPluginsState.INACTIVE: self.__tr("All plugins inactive"),
+        }
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.__modNames)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def headerData(self, section, orientation, role=qtDisplayRole):
+        if orientation == qtHorizontal and role == qtDisplayRole:
+            return [self.__tr("Merge name"), self.__tr("Plugins state")][section]
+        return None
+
+    def data(self, index, role=qtDisplayRole):
+        if not index.isValid():
+            return None
+        modName = self.__modNames[index.row()]
+        modPluginsState = self.__states[modName]
+        if role == qtDisplayRole:
+            if index.column() == 0:
+                return modName
+            return self.__descriptions[modPluginsState]
+        if role == qtSortRole:
+            return modName.lower() if index.column() == 0 else modPluginsState
+        if role == qtBackgroundRole:
+            return self.__colors[modPluginsState]
+        if role == qtForegroundRole and self.__colors[modPluginsState]:
+            return qtBlack
+        dependents = self.__dependents.get(modName)
+        if role == qtDecorationRole and index.column() == 0 and dependents:
+            return self.__warningIcon
+        if role == qtToolTipRole and dependents:
+            return "\n".join(
+                self.__tr("{} still masters hidden {}").format(plugin, master)
+                for plugin, master in dependents
+            )
+        if role == qtUserRole:
+            return {"modName": modName, "modPluginsState": modPluginsState}
+        return None
+
+    def setStates(self, states):
+        """Update the given merged mod states, adding unknown merged mods."""
+        added = [modName for modName in states if modName not in self.__rows]
+        for modName, modPluginsState in states.items():
+            if modName in self.__rows and self.__states[modName] != modPluginsState:
+                self.__states[modName] = modPluginsState
+                row = self.__rows[modName]
+                self.dataChanged.emit(self.index(row, 0), self.index(row, 1))
+        if added:
+            first = len(self.__modNames)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for modName in added:
+                self.__rows[modName] = len(self.__modNames)
+                self.__modNames.append(modName)
+                self.__states[modName] = states[modName]
+            self.endInsertRows()
+
+    def setDependents(self, dependents):
+        """Update the active plugins that master hidden plugins of merges."""
+        for modName, modDependents in dependents.items():
+            if modName in self.__rows and (
+                self.__dependents.get(modName, []) != modDependents
+            ):
+                self.__dependents[modName] = modDependents
+                row = self.__rows[modName]
+                self.dataChanged.emit(self.index(row, 0), self.index(row, 1))
+
+    def removeMergedMods(self, modNames):
+        for modName in modNames:
+            if modName in self.__rows:
+                row = self.__rows[modName]
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.__modNames[row]
+                del self.__states[modName]
+                self.__dependents.pop(modName, None)
+                self.__rows = {name: i for i, name in enumerate(self.__modNames)}
+                self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.__modNames = []
+        self.__rows = {}
+        self.__states = {}
+        self.__dependents = {}
+        self.endResetModel()
+
+
+class MergedModFilterModel(QSortFilterProxyModel):
+    """Sorts merged mods and filters them by plugins state."""
+
+    def __init__(self, parent=None):
+        super(MergedModFilterModel, self).__init__(parent)
+        self.__states = None
+        self.setSortRole(qtSortRole)
+        self.setSortCaseSensitivity(qtCaseInsensitive)
+        self.setDynamicSortFilter(True)
+
+    def setStateFilter(self, states):
+        self.__states = states
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        if self.__states is None:
+            return True
+        index = self.sourceModel().index(sourceRow, 0, sourceParent)
+        return index.data(qtUserRole)["modPluginsState"] in self.__states
+
+
 class PluginWindow(QtWidgets.QDialog):
     def __tr(self, str):
         return QCoreApplication.translate("MergePluginsHideWindow", str)
 
     def __init__(self, organizer, parent=None):
-        self.__pluginInfo = {}
-        self.__mergedModInfo = {}
+        self.__modStates = {}
+        self.__organizerPluginStates = None
+        self.__changedModPaths = set()
+        self.__watchedPaths = {}
+        self.__pendingModPaths = set()
+        self.__scanWorker = None
         self.__organizer = organizer
+        indexPath, self.__journalPath, headersPath = Me.getDataPaths(
+            organizer.getPluginDataPath()
+        )
+        self.__pluginIndex = Me.PluginIndex(indexPath)
+        self.__headerCache = Me.PluginHeaderCache(headersPath)
 
         super(PluginWindow, self).__init__(None)
 
@@ -40,6 +225,13 @@ class PluginWindow(QtWidgets.QDialog):
         self.__only_active_mods = organizer.pluginSetting(
             parent.name(), "only-active-mods"
         )
+        self.__hider = Me.PluginHider(
+            self.__hide_type,
+            self.__pluginIndex,
+            self.__journalPath,
+            self.getOrganizerPluginStates,
+            self.__headerCache,
+        )
 
         self.resize(500, 500)
         self.setWindowIcon(QtGui.QIcon(":/deorder/merge_plugins_hide"))
@@ -48,15 +240,36 @@ class PluginWindow(QtWidgets.QDialog):
         # Vertical Layout
         verticalLayout = QtWidgets.QVBoxLayout()
 
-        # Vertical Layout -> Merged Mod List (TODO: Better to use QTreeView and model?)
-        self.mergedModList = QtWidgets.QTreeWidget()
+        # Vertical Layout -> State Filter
+        self.stateFilter = QtWidgets.QComboBox(self)
+        self.stateFilter.addItem(self.__tr("All merges"), None)
+        self.stateFilter.addItem(
+            self.__tr("All plugins active"), [Dc.ModPluginsState.ACTIVE]
+        )
+        self.stateFilter.addItem(
+            self.__tr("Some plugins active"), [Dc.ModPluginsState.MIXED]
+        )
+        self.stateFilter.addItem(
+            self.__tr("All plugins inactive"), [Dc.ModPluginsState.INACTIVE]
+        )
+        self.stateFilter.addItem(self.__tr("Unknown"), [Dc.ModPluginsState.UNKNOWN])
+        self.stateFilter.currentIndexChanged.connect(self.onStateFilterChanged)
+        verticalLayout.addWidget(self.stateFilter)
+
+        # Vertical Layout -> Merged Mod List
+        self.mergedModModel = MergedModListModel(self)
+        self.mergedModFilter = MergedModFilterModel(self)
+        self.mergedModFilter.setSourceModel(self.mergedModModel)
 
-        self.mergedModList.setColumnCount(2)
+        self.mergedModList = QtWidgets.QTreeView()
+        self.mergedModList.setModel(self.mergedModFilter)
         self.mergedModList.setRootIsDecorated(False)
+        self.mergedModList.setUniformRowHeights(True)
+        self.mergedModList.setSortingEnabled(True)
+        self.mergedModList.sortByColumn(0, qtAscendingOrder)
+        self.mergedModList.setSelectionBehavior(QAbstractItemViewSelectRows)
 
         self.mergedModList.header().setVisible(True)
-        self.mergedModList.headerItem().setText(0, self.__tr("Merge name"))
-        self.mergedModList.headerItem().setText(1, self.__tr("Plugins state"))
 
         self.mergedModList.setContextMenuPolicy(qtCustomContextMenu)
         self.mergedModList.setHorizontalScrollBarPolicy(qtScrollBarAlwaysOff)
@@ -65,14 +278,20 @@ class PluginWindow(QtWidgets.QDialog):
 
         verticalLayout.addWidget(self.mergedModList)
 
+        # Vertical Layout -> Scan Progress
+        self.scanProgress = QtWidgets.QProgressBar(self)
+        self.scanProgress.setFormat(self.__tr("Scanning mods %v/%m"))
+        self.scanProgress.setVisible(False)
+        verticalLayout.addWidget(self.scanProgress)
+
         # Vertical Layout -> Button Layout
         buttonLayout = QtWidgets.QHBoxLayout()
 
         # Vertical Layout -> Button Layout -> Refresh Button
-        refreshButton = QtWidgets.QPushButton(self.__tr("&Refresh"), self)
-        refreshButton.setIcon(QtGui.QIcon(":/MO/gui/refresh"))
-        refreshButton.clicked.connect(self.refreshMergedModList)
-        buttonLayout.addWidget(refreshButton)
+        self.refreshButton = QtWidgets.QPushButton(self.__tr("&Refresh"), self)
+        self.refreshButton.setIcon(QtGui.QIcon(":/MO/gui/refresh"))
+        self.refreshButton.clicked.connect(self.rescanMergedModList)
+        buttonLayout.addWidget(self.refreshButton)
 
         # Vertical Layout -> Button Layout -> Close Button
         closeButton = QtWidgets.QPushButton(self.__tr("&Close"), self)
@@ -87,245 +306,303 @@ class PluginWindow(QtWidgets.QDialog):
         # Vertical Layout
         self.setLayout(verticalLayout)
 
-        # Build lookup dictionary of all plugins
+        # Watch merge metadata and mod roots with plugins for outside changes
+        self.__watcher = QFileSystemWatcher(self)
+        self.__watcher.directoryChanged.connect(self.onWatchedPathChanged)
+        self.__watcher.fileChanged.connect(self.onWatchedPathChanged)
+        self.__watchTimer = QTimer(self)
+        self.__watchTimer.setSingleShot(True)
+        self.__watchTimer.setInterval(500)
+        self.__watchTimer.timeout.connect(self.onWatchTimeout)
+
+        # Roll back renames of a hide / unhide that did not complete
+        try:
+            recovered = Me.RenameTransaction.recover(self.__journalPath)
+            if recovered:
+                self.__changedModPaths.add(None)
+                qWarning(
+                    self.__tr("Rolled back {} renames of an interrupted transaction")
+                    .format(recovered)
+                    .encode("utf-8")
+                )
+        except Exception as e:
+            qCritical(
+                self.__tr("Could not roll back interrupted transaction: {}")
+                .format(str(e))
+                .encode("utf-8")
+            )
+
+        self.__pluginIndex.load()
+        self.__headerCache.load()
+
+        self.scanMods()
+
+    def scanMods(self):
+        """Start scanning all mods in the background.
+
+        Mod states are queried from MO2 here on the GUI thread, the mod
+        directories are scanned by a ScanWorker and added as they arrive.
+        """
+        self.__modStates = {}
+        self.__pendingModPaths = set()
+        self.__hider.reset()
+        self.mergedModModel.clear()
+
         for mod in Dc.getMods(self.__organizer):
-            modState = Dc.getModStateByName(self.__organizer, mod.name())
-            if (
+            modState = self.getModState(mod.name())
+            addPlugins = (
                 self.__only_active_mods and (Dc.ModState.ACTIVE) in modState
-            ) or not self.__only_active_mods:
-                self.addPluginInfoFromParams(mod.absolutePath(), modState)
+            ) or not self.__only_active_mods
+            # Only active and valid mods count as merges
+            addMerge = (Dc.ModState.ACTIVE | Dc.ModState.VALID) in modState
+            self.__hider.addMod(
+                mod.absolutePath(), mod.name(), modState, addPlugins, addMerge
+            )
 
         # Add overwrite folder to plugin info dictionary
-        self.addPluginInfoFromParams(
-            self.__organizer.overwritePath(), (Dc.ModState.ACTIVE | Dc.ModState.VALID)
+        self.__hider.addMod(
+            self.__organizer.overwritePath(),
+            None,
+            (Dc.ModState.ACTIVE | Dc.ModState.VALID),
+            True,
+            False,
         )
 
-        # Build lookup dictionary of all merged mods
-        for mod in self.getMergedMods():
-            self.addMergedModInfoFromMod(mod)
-
+        modPaths = self.__hider.getModPaths()
+        self.refreshButton.setEnabled(False)
+        self.scanProgress.setRange(0, len(modPaths))
+        self.scanProgress.setValue(0)
+        self.scanProgress.setVisible(True)
         self.refreshMergedModList()
 
-    def isMergedMod(self, mod):
-        for path in glob.glob(
-            os.path.join(Dc.globEscape(mod.absolutePath()), "merge*", "merge.json")
-        ):
-            if os.path.isfile(path):
-                return True
-        for path in glob.glob(
-            os.path.join(Dc.globEscape(mod.absolutePath()), "merge*", "*_plugins.txt")
-        ):
-            if os.path.isfile(path):
-                return True
-        return False
-
-    def getMergedMods(self):
-        return [
-            mod
-            for mod in Dc.getMods(self.__organizer)
-            if self.isMergedMod(mod)
-            and (
-                (Dc.ModState.ACTIVE | Dc.ModState.VALID)
-                in Dc.getModStateByName(self.__organizer, mod.name())
+        self.__scanWorker = ScanWorker(
+            self.__pluginIndex, self.__headerCache, modPaths, self
+        )
+        self.__scanWorker.result_signal.connect(self.onModScanned)
+        self.__scanWorker.finish_signal.connect(self.onScanFinished)
+        self.__scanWorker.start()
+
+    def onModScanned(self, modPath, entry):
+        self.__hider.addScannedMod(modPath, entry)
+
+        progress = self.scanProgress.value() + 1
+        self.scanProgress.setValue(progress)
+        # Fill the list progressively, plugin states settle once done
+        if progress % 100 == 0:
+            self.refreshMergedModList()
+
+    def onScanFinished(self):
+        self.__scanWorker = None
+        self.scanProgress.setVisible(False)
+        self.refreshButton.setEnabled(True)
+
+        try:
+            self.__pluginIndex.save()
+        except Exception as e:
+            qWarning(
+                self.__tr("Could not save plugin index: {}")
+                .format(str(e))
+                .encode("utf-8")
             )
-        ]
 
-    def getMergedModPlugins(self, mod):
-        for path in glob.glob(
-            os.path.join(Dc.globEscape(mod.absolutePath()), "merge*", "merge.json")
-        ):
-            if os.path.isfile(path):
-                plugins = []
-                with open(path, "r", encoding="utf-8") as file:
-                    merge = json.load(file)
-                    plugins = [
-                        plugin["filename"].lower() for plugin in merge["plugins"]
-                    ]
-                return plugins
-        for path in glob.glob(
-            os.path.join(Dc.globEscape(mod.absolutePath()), "merge*", "*_plugins.txt")
-        ):
-            if os.path.isfile(path):
-                return Dc.readLines(path)
-        return []
-
-    def getPluginStateByName(self, name):
-        if name in self.__pluginInfo:
-            pluginInfo = self.__pluginInfo[name.lower()]
-            if self.__hide_type.lower() == "mohidden":
-                if all(
-                    [
-                        os.path.isfile(
-                            os.path.join(mod["dirname"], pluginInfo["filename"])
-                        )
-                        for mod in pluginInfo["mods"]
-                    ]
-                ):
-                    return Dc.PluginState(Dc.PluginState.ACTIVE)
-                if all(
-                    [
-                        os.path.isfile(
-                            os.path.join(
-                                mod["dirname"], pluginInfo["filename"] + ".mohidden"
-                            )
-                        )
-                        for mod in pluginInfo["mods"]
-                    ]
-                ):
-                    return Dc.PluginState(Dc.PluginState.INACTIVE)
-            if self.__hide_type.lower() == "optional":
-                if all(
-                    [
-                        os.path.isfile(
-                            os.path.join(mod["dirname"], pluginInfo["filename"])
-                        )
-                        for mod in pluginInfo["mods"]
-                    ]
-                ):
-                    return Dc.PluginState(Dc.PluginState.ACTIVE)
-                if all(
-                    [
-                        os.path.isfile(
-                            os.path.join(
-                                mod["dirname"], "optional", pluginInfo["filename"]
-                            )
-                        )
-                        for mod in pluginInfo["mods"]
-                    ]
-                ):
-                    return Dc.PluginState(Dc.PluginState.INACTIVE)
-            if self.__hide_type.lower() == "disable":
-                if all(
-                    [
-                        os.path.isfile(
-                            os.path.join(mod["dirname"], pluginInfo["filename"])
-                        )
-                        for mod in pluginInfo["mods"]
-                    ]
-                ):
-                    return Dc.getPluginStateByName(
-                        self.__organizer, pluginInfo["filename"]
-                    )
-        else:
-            qWarning(self.__tr("Plugin {} missing").format(name).encode("utf-8"))
-        return Dc.PluginState(Dc.PluginState.MISSING)
-
-    def getMergedModPluginsState(self, name):
-        if name in self.__mergedModInfo:
-            plugins = self.__mergedModInfo[name]["plugins"]
-            pluginstates = [
-                self.getPluginStateByName(plugin.lower()) for plugin in plugins
-            ]
-            if all(
-                (pluginstate in [Dc.PluginState.ACTIVE]) for pluginstate in pluginstates
-            ):
-                return Dc.ModPluginsState.ACTIVE
-            elif all(
-                (pluginstate in [Dc.PluginState.MISSING, Dc.PluginState.INACTIVE])
-                for pluginstate in pluginstates
-            ):
-                return Dc.ModPluginsState.INACTIVE
-            elif any(
-                (pluginstate in [Dc.PluginState.MISSING, Dc.PluginState.INACTIVE])
-                for pluginstate in pluginstates
-            ):
-                return Dc.ModPluginsState.MIXED
-        else:
-            qWarning(self.__tr("Merged mod {} missing").format(name).encode("utf-8"))
-        return Dc.ModPluginsState.UNKNOWN
-
-    def addMergedModInfoFromMod(self, mod):
-        self.__mergedModInfo[mod.name()] = {
-            "name": mod.name(),
-            "path": mod.absolutePath(),
-            "plugins": self.getMergedModPlugins(mod),
-            "modstate": Dc.getModStateByName(self.__organizer, mod.name()),
+        self.refreshMergedModList()
+        self.mergedModList.resizeColumnToContents(0)
+        self.updateWatchedPaths()
+
+        if self.__pendingModPaths:
+            self.__watchTimer.start()
+
+    def updateWatchedPaths(self):
+        watchedPaths = self.__hider.getWatchedPaths()
+        removed = [path for path in self.__watchedPaths if path not in watchedPaths]
+        # Files that are deleted and written again drop out of the watcher, so
+        # compare with what it actually watches rather than the last update
+        watching = {
+            os.path.normpath(path)
+            for path in self.__watcher.files() + self.__watcher.directories()
         }
-
-    def addPluginInfoFromMod(self, mod):
-        return self.addPluginInfoFromParams(
-            mod.absolutePath(), Dc.getModStateByName(self.__organizer, mod.name())
+        added = [path for path in watchedPaths if path not in watching]
+        if removed:
+            self.__watcher.removePaths(removed)
+        if added:
+            self.__watcher.addPaths(added)
+        self.__watchedPaths = watchedPaths
+
+    def onWatchedPathChanged(self, path):
+        modPath = self.__watchedPaths.get(os.path.normpath(path))
+        if modPath is not None:
+            self.__pendingModPaths.add(modPath)
+            # Restarting the timer debounces bursts of changes
+            self.__watchTimer.start()
+
+    def onWatchTimeout(self):
+        # Mods that changed during a scan are updated once it finished, mods
+        # that were already scanned would miss the changes otherwise
+        if self.isScanning():
+            return
+        plugins, modNames = set(), set()
+        for modPath in self.__pendingModPaths:
+            changedPlugins, changedModNames = self.updateMod(modPath)
+            plugins |= changedPlugins
+            modNames |= changedModNames
+        self.__pendingModPaths = set()
+        if plugins or modNames:
+            self.refreshMergedModListPlugins(plugins, modNames)
+            self.updateWatchedPaths()
+
+    def updateMod(self, modPath):
+        """Update a single mod from the plugin index.
+
+        Returns the plugins and merged mods whose state has to be recomputed.
+        """
+        plugins, modNames = self.__hider.updateMod(modPath)
+        self.mergedModModel.removeMergedMods(
+            [modName for modName in modNames if not self.__hider.isMergedMod(modName)]
         )
 
-    def addPluginInfoFromParams(self, modPath, modState):
-        mod = {"modstate": modState, "dirname": modPath}
-        patterns = ["*.esp", "*.esm", "*.esl"]
-        if self.__hide_type == "mohidden":
-            patterns = [
-                "*.esp",
-                "*.esm",
-                "*.esl",
-                "*.esp.mohidden",
-                "*.esm.mohidden",
-                "*.esl.mohidden",
-            ]
-        if self.__hide_type == "optional":
-            patterns = [
-                "*.esp",
-                "*.esm",
-                "*.esl",
-                os.path.join("optional", "*.esp"),
-                os.path.join("optional", "*.esm"),
-                os.path.join("optional", "*.esl"),
-            ]
-        for pattern in patterns:
-            for path in glob.glob(os.path.join(Dc.globEscape(modPath), pattern)):
-                if self.__hide_type == "mohidden":
-                    filename = os.path.basename(path).replace(".mohidden", "")
-                    if filename in self.__pluginInfo:
-                        self.__pluginInfo[filename.lower()]["mods"] += [mod]
-                    else:
-                        self.__pluginInfo[filename.lower()] = {
-                            "filename": os.path.basename(path).replace(".mohidden", ""),
-                            "mods": [mod],
-                        }
-                if self.__hide_type in ["optional", "disable"]:
-                    filename = os.path.basename(path)
-                    if filename in self.__pluginInfo:
-                        self.__pluginInfo[filename.lower()]["mods"] += [mod]
-                    else:
-                        self.__pluginInfo[filename.lower()] = {
-                            "filename": os.path.basename(path),
-                            "mods": [mod],
-                        }
+        try:
+            self.__pluginIndex.save()
+        except Exception as e:
+            qWarning(
+                self.__tr("Could not save plugin index: {}")
+                .format(str(e))
+                .encode("utf-8")
+            )
+        return plugins, modNames
+
+    def getChangedMods(self):
+        """Return (mods whose plugin files were moved, whether MO2 has to
+        refresh everything).
+
+        Renames rolled back on open and moves in paths that are not a mod,
+        such as the overwrite folder, need a full refresh.
+        """
+        if None in self.__changedModPaths:
+            return [], True
+        modsByPath = {
+            os.path.normcase(os.path.normpath(mod.absolutePath())): mod
+            for mod in Dc.getMods(self.__organizer)
+        }
+        mods = []
+        for modPath in self.__changedModPaths:
+            mod = modsByPath.get(os.path.normcase(os.path.normpath(modPath)))
+            if mod is None:
+                return [], True
+            mods.append(mod)
+        return mods, False
+
+    def isScanning(self):
+        return self.__scanWorker is not None
+
+    def rescanMergedModList(self):
+        if not self.isScanning():
+            self.scanMods()
+
+    def done(self, result):
+        if self.__scanWorker:
+            self.__scanWorker.stop()
+            self.__scanWorker.wait()
+        try:
+            self.__headerCache.save()
+        except Exception as e:
+            qWarning(
+                self.__tr("Could not save plugin headers: {}")
+                .format(str(e))
+                .encode("utf-8")
+            )
+        super(PluginWindow, self).done(result)
+
+    def getModState(self, name):
+        # Mod states do not change while scanning, query MO2 once per mod
+        if name not in self.__modStates:
+            self.__modStates[name] = Dc.getModStateByName(self.__organizer, name)
+        return self.__modStates[name]
+
+    def getOrganizerPluginStates(self):
+        # Read all MO2 plugin states once, kept up to date by our own changes
+        if self.__organizerPluginStates is None:
+            self.__organizerPluginStates = Dc.getPluginStates(self.__organizer)
+        return self.__organizerPluginStates
+
+    def setMergedModsPluginsActive(self, modNames, active):
+        """Enable or disable plugins of merged mods, returns changed plugins."""
+        if self.__hide_type == "disable":
+            state = Dc.PluginState.ACTIVE if active else Dc.PluginState.INACTIVE
+            organizerPluginStates = self.getOrganizerPluginStates()
+            changes = {}
+            for modName in modNames:
+                for plugin in self.__hider.getMergedModPlugins(modName):
+                    key = Me.pluginKey(plugin)
+                    record = self.__hider.getPluginRecord(key)
+                    if key in changes or record is None:
+                        continue
+                    if organizerPluginStates.get(key) != state:
+                        changes[key] = record.filename
+            Dc.setPluginStates(
+                self.__organizer,
+                {filename: state for filename in changes.values()},
+            )
+            for plugin in changes:
+                organizerPluginStates[plugin] = Dc.PluginState(state)
+            return set(changes)
 
-    def refreshMergedModList(self):
-        self.mergedModList.clear()
-        for modName in sorted(self.__mergedModInfo):
-            modPluginsState = self.getMergedModPluginsState(modName)
-            color = {
-                Dc.ModPluginsState.UNKNOWN: Dc.red,
-                Dc.ModPluginsState.ACTIVE: None,
-                Dc.ModPluginsState.MIXED: Dc.yellow,
-                Dc.ModPluginsState.INACTIVE: Dc.green,
-            }[modPluginsState]
-            stateDescription = {
-                Dc.ModPluginsState.UNKNOWN: self.__tr("Unknown"),
-                Dc.ModPluginsState.ACTIVE: self.__tr("All plugins active"),
-                Dc.ModPluginsState.MIXED: self.__tr("Some plugins active"),
-                Dc.ModPluginsState.INACTIVE: self.__tr("All plugins inactive"),
-            }[modPluginsState]
-            item = QtWidgets.QTreeWidgetItem(
-                self.mergedModList, [modName, stateDescription]
+        success, outcomes, changed, changedModPaths = (
+            self.__hider.setMergedModsPluginsActive(modNames, active)
+        )
+        self.__changedModPaths |= changedModPaths
+        if not success:
+            failed = [
+                outcome for outcome in outcomes if outcome["status"] != "rolled back"
+            ]
+            messageBox = QtWidgets.QMessageBox(
+                QtWidgets.QMessageBox.Icon.Warning,
+                self.__tr("Merge Plugins Hide"),
+                self.__tr("{} of {} renames failed, no plugins were changed.").format(
+                    len(failed), len(outcomes)
+                ),
+                QtWidgets.QMessageBox.StandardButton.Ok,
+                self,
             )
-            for x in range(2):
-                if color:
-                    item.setBackground(x, color)
-                    item.setForeground(x, qtBlack)
-                item.setData(
-                    x,
-                    qtUserRole,
-                    {"modName": modName, "modPluginsState": modPluginsState},
+            messageBox.setDetailedText(
+                "\n".join(
+                    "{}: {} -> {} {}".format(
+                        self.__tr(outcome["status"]),
+                        outcome["source"],
+                        outcome["target"],
+                        outcome["error"],
+                    )
+                    for outcome in outcomes
                 )
-            self.mergedModList.addTopLevelItem(item)
-        self.mergedModList.resizeColumnToContents(0)
+            )
+            messageBox.exec()
+        return changed
+
+    def refreshMergedModList(self):
+        self.__organizerPluginStates = None
+        self.__hider.invalidatePluginStates()
+        self.mergedModModel.setStates(self.__hider.getMergedModsPluginsStates())
+        # Reading masters waits for the scan, it caches the plugin headers
+        if not self.isScanning():
+            self.mergedModModel.setDependents(self.__hider.getMergedModsDependents())
+
+    def refreshMergedModListPlugins(self, plugins, modNames=()):
+        """Only recompute the given plugins and the merges containing them."""
+        modNames = set(modNames) | self.__hider.invalidatePluginStates(plugins)
+        self.mergedModModel.setStates(self.__hider.getMergedModsPluginsStates(modNames))
+        self.mergedModModel.setDependents(
+            self.__hider.getMergedModsDependents(modNames)
+        )
+
+    def onStateFilterChanged(self, index):
+        self.mergedModFilter.setStateFilter(self.stateFilter.itemData(index))
 
     def openMergedModMenu(self, position):
-        selectedItems = self.mergedModList.selectedItems()
-        if selectedItems:
+        selectedRows = self.mergedModList.selectionModel().selectedRows()
+        # Plugin states are incomplete until the scan has finished
+        if selectedRows and not self.isScanning():
             menu = QtWidgets.QMenu()
 
-            selectedItemsData = [item.data(0, qtUserRole) for item in selectedItems]
+            selectedItemsData = [index.data(qtUserRole) for index in selectedRows]
             selectedModsWithEnabled = [
                 selectedItemData["modName"]
                 for selectedItemData in selectedItemsData
@@ -357,80 +634,18 @@ class PluginWindow(QtWidgets.QDialog):
 
             # Catch and log exceptional side-effects
             try:
+                changed = set()
                 if action == enableAction:
-                    for selectedMod in selectedModsWithEnabled:
-                        for plugin in self.__mergedModInfo[selectedMod]["plugins"]:
-                            if plugin in self.__pluginInfo:
-                                pluginInfo = self.__pluginInfo[plugin.lower()]
-
-                                for mod in pluginInfo["mods"]:
-                                    if self.__hide_type == "mohidden":
-                                        Dc.tryMoveFile(
-                                            os.path.join(
-                                                mod["dirname"],
-                                                pluginInfo["filename"] + ".mohidden",
-                                            ),
-                                            os.path.join(
-                                                mod["dirname"], pluginInfo["filename"]
-                                            ),
-                                        )
-                                    if self.__hide_type == "optional":
-                                        Dc.tryMoveFile(
-                                            os.path.join(
-                                                mod["dirname"],
-                                                "optional",
-                                                pluginInfo["filename"],
-                                            ),
-                                            os.path.join(
-                                                mod["dirname"], pluginInfo["filename"]
-                                            ),
-                                        )
-                                    if self.__hide_type == "disable":
-                                        Dc.setPluginStateByName(
-                                            self.__organizer,
-                                            pluginInfo["filename"],
-                                            Dc.PluginState.ACTIVE,
-                                        )
+                    changed = self.setMergedModsPluginsActive(
+                        selectedModsWithEnabled, True
+                    )
 
                 if action == disableAction:
-                    for selectedMod in selectedModsWithDisabled:
-                        for plugin in self.__mergedModInfo[selectedMod]["plugins"]:
-                            if plugin in self.__pluginInfo:
-                                pluginInfo = self.__pluginInfo[plugin.lower()]
-
-                                for mod in pluginInfo["mods"]:
-                                    if self.__hide_type == "mohidden":
-                                        Dc.tryMoveFile(
-                                            os.path.join(
-                                                mod["dirname"], pluginInfo["filename"]
-                                            ),
-                                            os.path.join(
-                                                mod["dirname"],
-                                                pluginInfo["filename"] + ".mohidden",
-                                            ),
-                                        )
-                                    if self.__hide_type == "optional":
-                                        Dc.tryCreateDir(
-                                            os.path.join(mod["dirname"], "optional")
-                                        )
-                                        Dc.tryMoveFile(
-                                            os.path.join(
-                                                mod["dirname"], pluginInfo["filename"]
-                                            ),
-                                            os.path.join(
-                                                mod["dirname"],
-                                                "optional",
-                                                pluginInfo["filename"],
-                                            ),
-                                        )
-                                    if self.__hide_type == "disable":
-                                        Dc.setPluginStateByName(
-                                            self.__organizer,
-                                            pluginInfo["filename"],
-                                            Dc.PluginState.INACTIVE,
-                                        )
-
-                self.refreshMergedModList()
+                    changed = self.setMergedModsPluginsActive(
+                        selectedModsWithDisabled, False
+                    )
+
+                self.refreshMergedModListPlugins(changed)
             except Exception as e:
                 qCritical(traceback.format_exc().encode("utf-8"))
                 qCritical(str(e).encode("utf-8"))
@@ -478,13 +693,15 @@ class PluginTool(mobase.IPluginTool):
         self.__window.setWindowTitle(self.NAME)
         self.__window.exec()
 
-        # Refresh Mod Organizer mod list to reflect changes where files were changed
-        # outside MO2
-        if self.__organizer.pluginSetting(self.name(), "hide-type") in [
-            "mohidden",
-            "optional",
-        ]:
-            self.__organizer.refresh()
+        # Let Mod Organizer pick up plugin files that were moved outside MO2,
+        # only the mods that were touched are refreshed where possible
+        hideType = self.__organizer.pluginSetting(self.name(), "hide-type")
+        if hideType in ["mohidden", "optional"]:
+            mods, refreshAll = self.__window.getChangedMods()
+            if refreshAll:
+                self.__organizer.refresh()
+            for mod in mods:
+                self.__organizer.modDataChanged(mod)
 
     def icon(self):
         return QtGui.QIcon(":/deorder/merge_plugins_hide")
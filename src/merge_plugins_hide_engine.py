@@ -0,0 +1,1031 @@
+"""Mod scanning, plugin headers and hiding of merged plugins.
+
+    python merge_plugins_hide_engine.py --mods <mods> --profile <profile> \\
+        --overwrite <overwrite> hide "Merge *"
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import fnmatch
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+import concurrent.futures
+
+logger = logging.getLogger(__name__)
+
+pluginExtensions = (".esp", ".esm", ".esl")
+hiddenPluginExtensions = tuple(ext + ".mohidden" for ext in pluginExtensions)
+
+# TES4 record header: type, data size, flags, form id, version control info.
+# Oblivion record headers end after the form id.
+recordHeaderSize = 24
+oblivionRecordHeaderSize = 20
+recordFlagMaster = 0x1
+recordFlagLight = 0x200
+recordFlagCompressed = 0x40000
+
+
+class PluginState:
+    """Same values as common.PluginState."""
+
+    MISSING, INACTIVE, ACTIVE = list(range(3))
+
+
+class ModPluginsState:
+    """Same values as common.ModPluginsState."""
+
+    UNKNOWN, INACTIVE, MIXED, ACTIVE = list(range(4))
+
+    NAMES = {UNKNOWN: "unknown", INACTIVE: "inactive", MIXED: "mixed", ACTIVE: "active"}
+
+
+def readLines(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return [line.strip() for line in file.readlines()]
+
+
+def readMergeMetadata(path):
+    """Return the (merged) plugins listed in a merge.json or *_plugins.txt."""
+    if os.path.basename(path).lower() == "merge.json":
+        with open(path, "r", encoding="utf-8") as file:
+            merge = json.load(file)
+            return [plugin["filename"].lower() for plugin in merge["plugins"]]
+    return readLines(path)
+
+
+def scanMod(modPath):
+    """Scan a mod for plugins and merge metadata in a single pass.
+
+    Plugins are returned as (filename, location) where location is "" for
+    plugins in the mod root, "mohidden" for plugins hidden with a .mohidden
+    suffix and "optional" for plugins in the optional subdirectory. The
+    mtimes of the mod dir and of the scanned subdirs are recorded so the
+    result can be validated later, see PluginIndex. The mtimes are empty
+    when the mod dir could not be read, such a result is not cached.
+    """
+    result = {"mtimes": {}, "plugins": [], "merge": None}
+    try:
+        result["mtimes"][""] = os.stat(modPath).st_mtime_ns
+        subdirs = []
+        with os.scandir(modPath) as entries:
+            for entry in entries:
+                name = entry.name.lower()
+                if name.endswith(pluginExtensions):
+                    if entry.is_file():
+                        result["plugins"].append((entry.name, ""))
+                elif name.endswith(hiddenPluginExtensions):
+                    if entry.is_file():
+                        result["plugins"].append(
+                            (entry.name[: -len(".mohidden")], "mohidden")
+                        )
+                elif (name == "optional" or name.startswith("merge")) and (
+                    entry.is_dir()
+                ):
+                    result["mtimes"][entry.name] = entry.stat().st_mtime_ns
+                    subdirs.append(entry.name)
+    except OSError:
+        result["mtimes"] = {}
+        return result
+
+    mergeJsonPaths = []
+    pluginsTxtPaths = []
+    for subdir in sorted(subdirs):
+        try:
+            with os.scandir(os.path.join(modPath, subdir)) as entries:
+                for entry in entries:
+                    name = entry.name.lower()
+                    if subdir.lower() == "optional":
+                        if name.endswith(pluginExtensions) and entry.is_file():
+                            result["plugins"].append((entry.name, "optional"))
+                    elif name == "merge.json" and entry.is_file():
+                        mergeJsonPaths.append(entry.path)
+                    elif name.endswith("_plugins.txt") and entry.is_file():
+                        pluginsTxtPaths.append(entry.path)
+        except OSError:
+            pass
+
+    # merge.json takes precedence over *_plugins.txt
+    for path in mergeJsonPaths + pluginsTxtPaths:
+        result["merge"] = readMergeInfo(path)
+        break
+    return result
+
+
+def readMergeInfo(path):
+    """Parse merge metadata, recording its mtime and size for validation."""
+    info = {"path": path, "plugins": [], "mtime": None, "size": None}
+    try:
+        stat = os.stat(path)
+        info["mtime"], info["size"] = stat.st_mtime_ns, stat.st_size
+        info["plugins"] = readMergeMetadata(path)
+    except Exception as e:
+        logger.warning("Could not read %s: %s", path, e)
+    return info
+
+
+def isMergeInfoValid(info):
+    try:
+        stat = os.stat(info["path"])
+    except OSError:
+        return False
+    return stat.st_mtime_ns == info["mtime"] and stat.st_size == info["size"]
+
+
+def getPluginPath(modPath, filename, location):
+    if location == "mohidden":
+        return os.path.join(modPath, filename + ".mohidden")
+    if location == "optional":
+        return os.path.join(modPath, "optional", filename)
+    return os.path.join(modPath, filename)
+
+
+class RenameTransaction:
+    """All-or-nothing batch of file renames executed in parallel.
+
+    The planned renames are journaled to disk before they are executed. When
+    a rename fails every completed rename is rolled back, and a journal left
+    behind by an interrupted transaction is rolled back by recover().
+    """
+
+    def __init__(self, journalPath):
+        self.__journalPath = journalPath
+        self.__dirs = []
+        self.__renames = []
+        self.__max_workers = min(8, max(1, multiprocessing.cpu_count()))
+
+    def __len__(self):
+        return len(self.__renames)
+
+    def addDir(self, path):
+        if path not in self.__dirs:
+            self.__dirs.append(path)
+
+    def addRename(self, source, target):
+        self.__renames.append((source, target))
+
+    @staticmethod
+    def rename(source, target):
+        # os.rename silently replaces existing files on POSIX
+        if os.path.lexists(target):
+            raise FileExistsError("Target {} already exists".format(target))
+        os.rename(source, target)
+
+    def writeJournal(self):
+        os.makedirs(os.path.dirname(self.__journalPath), exist_ok=True)
+        tempPath = self.__journalPath + ".tmp"
+        with open(tempPath, "w", encoding="utf-8") as file:
+            json.dump({"renames": self.__renames}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tempPath, self.__journalPath)
+
+    def execute(self):
+        """Execute all renames, returns (success, per-file outcomes)."""
+        outcomes = [
+            {"source": source, "target": target, "status": "pending", "error": ""}
+            for source, target in self.__renames
+        ]
+        if not outcomes:
+            return True, outcomes
+
+        self.writeJournal()
+        try:
+            for path in self.__dirs:
+                os.makedirs(path, exist_ok=True)
+
+            def renameTask(outcome):
+                try:
+                    self.rename(outcome["source"], outcome["target"])
+                    outcome["status"] = "renamed"
+                except Exception as e:
+                    outcome["status"] = "failed"
+                    outcome["error"] = str(e)
+
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.__max_workers
+            ) as executor:
+                list(executor.map(renameTask, outcomes))
+        except Exception as e:
+            for outcome in outcomes:
+                if outcome["status"] == "pending":
+                    outcome["status"] = "failed"
+                    outcome["error"] = str(e)
+
+        success = all(outcome["status"] == "renamed" for outcome in outcomes)
+        if not success:
+            for outcome in reversed(outcomes):
+                if outcome["status"] != "renamed":
+                    continue
+                try:
+                    self.rename(outcome["target"], outcome["source"])
+                    outcome["status"] = "rolled back"
+                except Exception as e:
+                    outcome["status"] = "rollback failed"
+                    outcome["error"] = str(e)
+
+        # Keep the journal when the rollback itself failed
+        if all(outcome["status"] != "rollback failed" for outcome in outcomes):
+            os.remove(self.__journalPath)
+        return success, outcomes
+
+    @staticmethod
+    def recover(journalPath):
+        """Roll back a transaction that was interrupted, returns the count."""
+        if not os.path.isfile(journalPath):
+            return 0
+        with open(journalPath, "r", encoding="utf-8") as file:
+            renames = json.load(file)["renames"]
+        count = 0
+        for source, target in reversed(renames):
+            if os.path.lexists(target) and not os.path.lexists(source):
+                os.rename(target, source)
+                count += 1
+        os.remove(journalPath)
+        return count
+
+
+class JsonCache:
+    """Entries keyed by path, persisted as a JSON file.
+
+    Only the entries that were set since loading are saved, so entries of
+    removed mods and plugins are dropped. Without a path the entries are
+    only kept in memory. Safe to use from multiple threads.
+    """
+
+    VERSION = 1
+    NAME = "cache"
+    KEY = "entries"
+
+    def __init__(self, path=None):
+        self.__path = path
+        self.__entries = {}
+        self.__used = set()
+        self.__dirty = False
+        self.__lock = threading.Lock()
+
+    def load(self):
+        if self.__path is None:
+            return
+        try:
+            with open(self.__path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("version") == self.VERSION:
+                self.__entries = data[self.KEY]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Could not load %s %s: %s", self.NAME, self.__path, e)
+
+    def save(self):
+        if self.__path is None:
+            return
+        if not self.__dirty and len(self.__used) == len(self.__entries):
+            return
+        entries = {key: self.__entries[key] for key in self.__used}
+        os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+        tempPath = self.__path + ".tmp"
+        with open(tempPath, "w", encoding="utf-8") as file:
+            json.dump({"version": self.VERSION, self.KEY: entries}, file)
+        os.replace(tempPath, self.__path)
+        self.__entries = entries
+        self.__dirty = False
+
+    def getEntry(self, key):
+        with self.__lock:
+            return self.__entries.get(key)
+
+    def setEntry(self, key, entry):
+        """Store an entry and keep it on save, None drops the entry."""
+        with self.__lock:
+            if entry is None:
+                if self.__entries.pop(key, None) is not None:
+                    self.__dirty = True
+                self.__used.discard(key)
+                return
+            if self.__entries.get(key) is not entry:
+                self.__entries[key] = entry
+                self.__dirty = True
+            self.__used.add(key)
+
+
+class PluginIndex(JsonCache):
+    """Persistent cache of the plugins and merge metadata of each mod.
+
+    Entries are keyed by mod path and only rescanned when the mtime of the
+    mod dir or of one of its optional / merge* subdirs changed. Merge
+    metadata is re-parsed on its own when the mtime or size of the metadata
+    file changed.
+    """
+
+    VERSION = 2
+    NAME = "plugin index"
+    KEY = "mods"
+
+    def isValid(self, modPath, entry):
+        # Failed scans have no mtimes
+        if not entry["mtimes"]:
+            return False
+        try:
+            for subdir, mtime in entry["mtimes"].items():
+                if os.stat(os.path.join(modPath, subdir)).st_mtime_ns != mtime:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def getMod(self, modPath):
+        # Safe to call from multiple threads, mods are scanned outside the lock
+        entry = self.getEntry(modPath)
+        if entry is None or not self.isValid(modPath, entry):
+            entry = scanMod(modPath)
+        elif entry["merge"] and not isMergeInfoValid(entry["merge"]):
+            entry = dict(entry, merge=readMergeInfo(entry["merge"]["path"]))
+        # Failed scans are not cached, the mod is scanned again
+        self.setEntry(modPath, entry if entry["mtimes"] else None)
+        return entry
+
+
+def readPluginHeader(path):
+    """Read the TES4 record of a plugin without reading the rest of the file.
+
+    Only the record header and its subrecords are mapped into memory, so
+    this is cheap even for plugins of hundreds of MB. Returns a dict with
+    the masters, the ESM / ESL flags and the record count from HEDR.
+    Oblivion plugins are recognized by HEDR following a 20 byte header.
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < recordHeaderSize:
+            raise ValueError("{} is too small to be a plugin".format(path))
+        with mmap.mmap(
+            file.fileno(), recordHeaderSize, access=mmap.ACCESS_READ
+        ) as record:
+            recordType, dataSize, flags = struct.unpack_from("<4sII", record)
+            headerSize = recordHeaderSize
+            if record[oblivionRecordHeaderSize:recordHeaderSize] == b"HEDR":
+                headerSize = oblivionRecordHeaderSize
+        if recordType != b"TES4":
+            raise ValueError("{} has no TES4 header".format(path))
+        if flags & recordFlagCompressed:
+            raise ValueError("{} has a compressed TES4 header".format(path))
+
+        length = min(size, headerSize + dataSize)
+        masters, records = [], None
+        with mmap.mmap(file.fileno(), length, access=mmap.ACCESS_READ) as record:
+            offset, largeSize = headerSize, None
+            while offset + 6 <= length:
+                subrecordType, subrecordSize = struct.unpack_from(
+                    "<4sH", record, offset
+                )
+                offset += 6
+                # XXXX holds the size of the next subrecord when it exceeds 64K
+                if largeSize is not None:
+                    subrecordSize, largeSize = largeSize, None
+                if subrecordType == b"XXXX":
+                    (largeSize,) = struct.unpack_from("<I", record, offset)
+                elif subrecordType == b"HEDR" and subrecordSize >= 8:
+                    (records,) = struct.unpack_from("<i", record, offset + 4)
+                elif subrecordType == b"MAST":
+                    name = record[offset : offset + subrecordSize].split(b"\0", 1)[0]
+                    masters.append(name.decode("cp1252", errors="replace"))
+                offset += subrecordSize
+    return {
+        "masters": masters,
+        "esm": bool(flags & recordFlagMaster),
+        "esl": bool(flags & recordFlagLight),
+        "records": records,
+    }
+
+
+class PluginHeaderCache(JsonCache):
+    """Persistent cache of plugin headers, validated by file size and mtime."""
+
+    # 2: Oblivion headers
+    VERSION = 2
+    NAME = "plugin headers"
+    KEY = "headers"
+
+    def get(self, path):
+        """Return the header of a plugin, None when it can not be read."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        entry = self.getEntry(path)
+        if (
+            entry is None
+            or entry["size"] != stat.st_size
+            or entry["mtime"] != stat.st_mtime_ns
+        ):
+            try:
+                header = readPluginHeader(path)
+            except Exception as e:
+                logger.warning("Could not read plugin header %s: %s", path, e)
+                header = None
+            entry = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "header": header}
+        self.setEntry(path, entry)
+        return entry["header"]
+
+
+def readPluginHeaders(headerCache, paths, maxWorkers=None):
+    """Fill the header cache for the given plugins on a thread pool."""
+    if maxWorkers is None:
+        maxWorkers = min(4, max(1, multiprocessing.cpu_count() - 1))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        list(executor.map(headerCache.get, paths))
+
+
+def scanMods(pluginIndex, modPaths, maxWorkers=None):
+    """Look up mods in the plugin index on a thread pool.
+
+    Yields (modPath, entry) as the lookups complete. Lookups that have not
+    started yet are cancelled when the generator is closed early.
+    """
+    if maxWorkers is None:
+        maxWorkers = min(4, max(1, multiprocessing.cpu_count() - 1))
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers)
+    try:
+        futures = {
+            executor.submit(pluginIndex.getMod, modPath): modPath
+            for modPath in modPaths
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                entry = future.result()
+            except Exception as e:
+                logger.warning("Could not scan %s: %s", futures[future], e)
+                continue
+            yield futures[future], entry
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def pluginKey(name):
+    """Return the case-insensitive key of a plugin name.
+
+    Keys are interned so the plugin records, the merges and the reverse
+    indexes all share a single string per plugin.
+    """
+    return sys.intern(name.casefold())
+
+
+# Locations of a plugin file in a mod, as bits of PluginRecord.locations
+locationBits = {"": 0x1, "mohidden": 0x2, "optional": 0x4}
+
+
+class PluginRecord:
+    """A plugin and the mods providing it.
+
+    Providers are indices into the mod table of PluginHider. For each
+    provider filenames holds the name of the plugin file, which can differ
+    in case between mods, and locations the location bits of the plugin
+    file, kept up to date on renames.
+    """
+
+    __slots__ = ("filenames", "providers", "locations")
+
+    def __init__(self):
+        self.filenames = []
+        self.providers = []
+        self.locations = []
+
+    @property
+    def filename(self):
+        return self.filenames[0]
+
+    def addLocation(self, modIndex, filename, location):
+        if modIndex in self.providers:
+            self.locations[self.providers.index(modIndex)] |= locationBits[location]
+        else:
+            self.filenames.append(filename)
+            self.providers.append(modIndex)
+            self.locations.append(locationBits[location])
+
+    def moveLocation(self, modIndex, source, target):
+        i = self.providers.index(modIndex)
+        self.locations[i] = (self.locations[i] & ~locationBits[source]) | (
+            locationBits[target]
+        )
+
+    def removeProvider(self, modIndex):
+        if modIndex in self.providers:
+            i = self.providers.index(modIndex)
+            del self.filenames[i]
+            del self.providers[i]
+            del self.locations[i]
+
+    def hasLocation(self, modIndex, location):
+        return bool(
+            self.locations[self.providers.index(modIndex)] & locationBits[location]
+        )
+
+    def allIn(self, location):
+        """Whether the plugin file is in the location in every provider."""
+        return all(bits & locationBits[location] for bits in self.locations)
+
+    def getLocations(self, modIndex):
+        bits = self.locations[self.providers.index(modIndex)]
+        return [location for location, bit in locationBits.items() if bits & bit]
+
+
+class PluginHider:
+    """Plugins and merges of a set of mods and the logic to hide them.
+
+    Mods are registered with addMod() and filled in by addScannedMod() as
+    their plugin index entries arrive, or all at once by scan(). Mod states
+    are not interpreted, only handed back with the plugin info. With the
+    disable hide type plugin states are read through getPluginStates, a
+    callable returning {pluginKey(name): state}. Masters are read through
+    headerCache, without it no dependents are reported.
+    """
+
+    def __init__(
+        self,
+        hideType,
+        pluginIndex,
+        journalPath,
+        getPluginStates=None,
+        headerCache=None,
+    ):
+        self.__hideType = hideType.lower()
+        self.__pluginIndex = pluginIndex
+        self.__journalPath = journalPath
+        self.__getPluginStates = getPluginStates
+        self.__headerCache = headerCache
+        self.reset()
+
+    def reset(self):
+        self.__plugins = {}
+        self.__modPaths = []
+        self.__mergedModInfo = {}
+        self.__modEntries = {}
+        self.__scanTargets = {}
+        self.__pluginStates = {}
+        self.__pluginMergedMods = {}
+        self.__pluginMasters = None
+        self.__masterDependents = None
+
+    def getHideType(self):
+        return self.__hideType
+
+    def addMod(self, modPath, modName, modState, addPlugins, addMerge):
+        """Register a mod to scan for plugins and / or merge metadata."""
+        if (addPlugins or addMerge) and modPath not in self.__scanTargets:
+            self.__scanTargets[modPath] = {
+                "index": len(self.__modPaths),
+                "name": modName,
+                "modstate": modState,
+                "plugins": addPlugins,
+                "merge": addMerge,
+            }
+            self.__modPaths.append(modPath)
+
+    def getModPaths(self):
+        return list(self.__modPaths)
+
+    def addScannedMod(self, modPath, entry):
+        self.__modEntries[modPath] = entry
+        scanTarget = self.__scanTargets[modPath]
+        if scanTarget["plugins"]:
+            self.addPluginInfo(modPath)
+        if scanTarget["merge"] and entry["merge"] is not None:
+            self.addMergedModInfo(scanTarget["name"], modPath, scanTarget["modstate"])
+
+    def scan(self):
+        for modPath, entry in scanMods(self.__pluginIndex, self.getModPaths()):
+            self.addScannedMod(modPath, entry)
+        self.__pluginStates = {}
+
+    def updateMod(self, modPath):
+        """Update a single mod from the plugin index.
+
+        Returns the plugins and merged mods whose state has to be recomputed,
+        merged mods that are no longer merges are included.
+        """
+        scanTarget = self.__scanTargets.get(modPath)
+        oldEntry = self.__modEntries.get(modPath)
+        if scanTarget is None or oldEntry is None:
+            return set(), set()
+        entry = self.__pluginIndex.getMod(modPath)
+        if entry is oldEntry:
+            return set(), set()
+        self.__modEntries[modPath] = entry
+        self.__pluginMasters = None
+
+        plugins, modNames = set(), set()
+        if scanTarget["plugins"]:
+            for filename, _ in oldEntry["plugins"]:
+                plugin = pluginKey(filename)
+                record = self.__plugins.get(plugin)
+                if record:
+                    record.removeProvider(scanTarget["index"])
+                    if not record.providers:
+                        del self.__plugins[plugin]
+                plugins.add(plugin)
+            self.addPluginInfo(modPath)
+            plugins |= set(pluginKey(filename) for filename, _ in entry["plugins"])
+
+        if scanTarget["merge"]:
+            modName = scanTarget["name"]
+            mergedModInfo = self.__mergedModInfo.pop(modName, None)
+            if mergedModInfo:
+                for plugin in mergedModInfo["keys"]:
+                    self.__pluginMergedMods.get(plugin, set()).discard(modName)
+            if entry["merge"] is not None:
+                self.addMergedModInfo(modName, modPath, scanTarget["modstate"])
+            modNames.add(modName)
+        return plugins, modNames
+
+    def getModEntry(self, modPath):
+        if modPath not in self.__modEntries:
+            self.__modEntries[modPath] = self.__pluginIndex.getMod(modPath)
+        return self.__modEntries[modPath]
+
+    def getMergeInfo(self, modPath):
+        return self.getModEntry(modPath)["merge"]
+
+    def getPluginRecord(self, name):
+        return self.__plugins.get(pluginKey(name))
+
+    def getMergedModNames(self):
+        return list(self.__mergedModInfo)
+
+    def isMergedMod(self, modName):
+        return modName in self.__mergedModInfo
+
+    def getMergedModPlugins(self, modName):
+        return list(self.__mergedModInfo[modName]["plugins"])
+
+    def getWatchedPaths(self):
+        """Return {path: mod path} of the dirs and files with plugins or merges."""
+        watchedPaths = {}
+        modIndices = set()
+        for record in self.__plugins.values():
+            modIndices.update(record.providers)
+        for modIndex in modIndices:
+            modPath = self.__modPaths[modIndex]
+            watchedPaths[os.path.normpath(modPath)] = modPath
+            if self.__hideType == "optional":
+                for subdir in self.getModEntry(modPath)["mtimes"]:
+                    if subdir.lower() == "optional":
+                        path = os.path.normpath(os.path.join(modPath, subdir))
+                        watchedPaths[path] = modPath
+        for mergedModInfo in self.__mergedModInfo.values():
+            modPath = mergedModInfo["path"]
+            merge = self.getMergeInfo(modPath)
+            if merge:
+                # The dir catches metadata that is deleted and written again
+                watchedPaths[os.path.normpath(merge["path"])] = modPath
+                watchedPaths[os.path.normpath(os.path.dirname(merge["path"]))] = modPath
+        return watchedPaths
+
+    def getPluginState(self, name):
+        plugin = pluginKey(name)
+        record = self.__plugins.get(plugin)
+        if record is not None:
+            if self.__hideType == "mohidden":
+                if record.allIn(""):
+                    return PluginState.ACTIVE
+                if record.allIn("mohidden"):
+                    return PluginState.INACTIVE
+            if self.__hideType == "optional":
+                if record.allIn(""):
+                    return PluginState.ACTIVE
+                if record.allIn("optional"):
+                    return PluginState.INACTIVE
+            if self.__hideType == "disable" and self.__getPluginStates:
+                if record.allIn(""):
+                    return self.__getPluginStates().get(plugin, PluginState.MISSING)
+        return PluginState.MISSING
+
+    def getCachedPluginState(self, plugin):
+        if plugin not in self.__pluginStates:
+            self.__pluginStates[plugin] = self.getPluginState(plugin)
+        return self.__pluginStates[plugin]
+
+    def invalidatePluginStates(self, plugins=None):
+        """Forget cached plugin states, returns the merged mods affected."""
+        if plugins is None:
+            self.__pluginStates = {}
+            return set(self.__mergedModInfo)
+        modNames = set()
+        for plugin in plugins:
+            self.__pluginStates.pop(plugin, None)
+            modNames |= self.__pluginMergedMods.get(plugin, set())
+            # A plugin that changed state can also change the dependents of
+            # the merges containing its masters
+            for master in (self.__pluginMasters or {}).get(plugin, ()):
+                modNames |= self.__pluginMergedMods.get(master, set())
+        return modNames
+
+    def getMergedModPluginsState(self, name):
+        if name in self.__mergedModInfo:
+            plugins = self.__mergedModInfo[name]["keys"]
+            pluginstates = [self.getCachedPluginState(plugin) for plugin in plugins]
+            if all(
+                (pluginstate in [PluginState.ACTIVE]) for pluginstate in pluginstates
+            ):
+                return ModPluginsState.ACTIVE
+            elif all(
+                (pluginstate in [PluginState.MISSING, PluginState.INACTIVE])
+                for pluginstate in pluginstates
+            ):
+                return ModPluginsState.INACTIVE
+            elif any(
+                (pluginstate in [PluginState.MISSING, PluginState.INACTIVE])
+                for pluginstate in pluginstates
+            ):
+                return ModPluginsState.MIXED
+        else:
+            logger.warning("Merged mod %s missing", name)
+        return ModPluginsState.UNKNOWN
+
+    def getMergedModsPluginsStates(self, modNames=None):
+        return {
+            modName: self.getMergedModPluginsState(modName)
+            for modName in (self.__mergedModInfo if modNames is None else modNames)
+            if modName in self.__mergedModInfo
+        }
+
+    def getPluginMasters(self):
+        """Return {plugin: masters} of all plugins, read from their headers."""
+        if self.__pluginMasters is None:
+            self.__pluginMasters = {}
+            self.__masterDependents = {}
+            for plugin, record in self.__plugins.items():
+                header = None
+                if record.providers and self.__headerCache is not None:
+                    modIndex = record.providers[0]
+                    header = self.__headerCache.get(
+                        getPluginPath(
+                            self.__modPaths[modIndex],
+                            record.filename,
+                            record.getLocations(modIndex)[0],
+                        )
+                    )
+                masters = [
+                    pluginKey(master) for master in (header or {}).get("masters", [])
+                ]
+                self.__pluginMasters[plugin] = masters
+                for master in masters:
+                    self.__masterDependents.setdefault(master, set()).add(plugin)
+        return self.__pluginMasters
+
+    def getMergedModDependents(self, modName):
+        """Return (plugin, master) of active plugins mastering hidden plugins.
+
+        These plugins still need a merged plugin that was hidden, and will
+        fail to load until the merged plugin is unhidden or they are hidden
+        as well.
+        """
+        self.getPluginMasters()
+        dependents = []
+        mergedModInfo = self.__mergedModInfo[modName]
+        for name, plugin in zip(mergedModInfo["plugins"], mergedModInfo["keys"]):
+            if self.getCachedPluginState(plugin) != PluginState.INACTIVE:
+                continue
+            for dependent in self.__masterDependents.get(plugin, ()):
+                if self.getCachedPluginState(dependent) == PluginState.ACTIVE:
+                    dependents.append((self.__plugins[dependent].filename, name))
+        return sorted(dependents)
+
+    def getMergedModsDependents(self, modNames=None):
+        return {
+            modName: self.getMergedModDependents(modName)
+            for modName in (self.__mergedModInfo if modNames is None else modNames)
+            if modName in self.__mergedModInfo
+        }
+
+    def addMergedModInfo(self, modName, modPath, modState):
+        merge = self.getMergeInfo(modPath)
+        plugins = list(merge["plugins"]) if merge else []
+        self.__mergedModInfo[modName] = {
+            "name": modName,
+            "path": modPath,
+            "plugins": plugins,
+            "keys": [pluginKey(plugin) for plugin in plugins],
+            "modstate": modState,
+        }
+        # Reverse index to find the merges affected by a plugin change
+        for plugin in self.__mergedModInfo[modName]["keys"]:
+            self.__pluginMergedMods.setdefault(plugin, set()).add(modName)
+
+    def addPluginInfo(self, modPath):
+        modIndex = self.__scanTargets[modPath]["index"]
+        locations = [""]
+        if self.__hideType == "mohidden":
+            locations = ["", "mohidden"]
+        if self.__hideType == "optional":
+            locations = ["", "optional"]
+        for filename, location in self.getModEntry(modPath)["plugins"]:
+            if location not in locations:
+                continue
+            plugin = pluginKey(filename)
+            record = self.__plugins.get(plugin)
+            if record is None:
+                record = self.__plugins[plugin] = PluginRecord()
+            record.addLocation(modIndex, filename, location)
+
+    def setMergedModsPluginsActive(self, modNames, active):
+        """Hide or unhide the plugins of merged mods as a single transaction.
+
+        Only for the mohidden and optional hide types. Returns (success,
+        per-file outcomes, changed plugins, changed mod paths); the changed
+        mod paths include mods left changed by a failed rollback.
+        """
+        hiddenLocation = self.__hideType
+        sourceLocation, targetLocation = (
+            (hiddenLocation, "") if active else ("", hiddenLocation)
+        )
+        transaction = RenameTransaction(self.__journalPath)
+        moves = []
+        planned = set()
+        for modName in modNames:
+            for plugin in self.__mergedModInfo[modName]["keys"]:
+                record = self.__plugins.get(plugin)
+                if record is None:
+                    continue
+                for modIndex, filename in zip(record.providers, record.filenames):
+                    if not record.hasLocation(modIndex, sourceLocation):
+                        continue
+                    if (plugin, modIndex) in planned:
+                        continue
+                    planned.add((plugin, modIndex))
+                    modPath = self.__modPaths[modIndex]
+                    if targetLocation == "optional":
+                        transaction.addDir(os.path.join(modPath, "optional"))
+                    transaction.addRename(
+                        getPluginPath(modPath, filename, sourceLocation),
+                        getPluginPath(modPath, filename, targetLocation),
+                    )
+                    moves.append((plugin, record, modIndex))
+
+        success, outcomes = transaction.execute()
+        # Renames are added in the order of moves, remember which mods changed
+        changedModPaths = set(
+            self.__modPaths[modIndex]
+            for (_, _, modIndex), outcome in zip(moves, outcomes)
+            if outcome["status"] in ["renamed", "rollback failed"]
+        )
+        for outcome in outcomes:
+            logger.debug(
+                "%s %s to %s", outcome["status"], outcome["source"], outcome["target"]
+            )
+
+        changedPlugins = set()
+        if success:
+            for _, record, modIndex in moves:
+                record.moveLocation(modIndex, sourceLocation, targetLocation)
+            changedPlugins = set(plugin for plugin, _, _ in moves)
+        return success, outcomes, changedPlugins, changedModPaths
+
+
+def getDataPaths(dataPath):
+    """Return the plugin index, journal and plugin header cache paths."""
+    return (
+        os.path.join(dataPath, "merge_plugins_hide", "index.json"),
+        os.path.join(dataPath, "merge_plugins_hide", "journal.json"),
+        os.path.join(dataPath, "merge_plugins_hide", "headers.json"),
+    )
+
+
+def readModList(profilePath):
+    """Return (name, enabled) of the mods in a profile's modlist.txt."""
+    mods = []
+    for line in readLines(os.path.join(profilePath, "modlist.txt")):
+        # Skip comments and unmanaged mods (*)
+        if line[:1] in ["+", "-"]:
+            mods.append((line[1:], line[0] == "+"))
+    return mods
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="List, hide or unhide the plugins of merged mods."
+    )
+    parser.add_argument("--mods", required=True, help="MO2 mods directory")
+    parser.add_argument("--profile", required=True, help="MO2 profile directory")
+    parser.add_argument("--overwrite", required=True, help="MO2 overwrite directory")
+    parser.add_argument(
+        "--hide-type", choices=["mohidden", "optional"], default="mohidden"
+    )
+    parser.add_argument(
+        "--all-mods",
+        action="store_true",
+        help="Also hide/unhide plugins in inactive mods",
+    )
+    parser.add_argument(
+        "--data-dir",
+        help="MO2 plugin data directory to share the index and journal with",
+    )
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", help="Output JSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "list", parents=[common], help="Merged mods and their plugins state"
+    ).add_argument("patterns", nargs="*", metavar="PATTERN")
+    subparsers.add_parser(
+        "hide", parents=[common], help="Hide the plugins of merged mods"
+    ).add_argument("patterns", nargs="*", metavar="PATTERN")
+    subparsers.add_parser(
+        "unhide", parents=[common], help="Unhide the plugins of merged mods"
+    ).add_argument("patterns", nargs="*", metavar="PATTERN")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    if args.data_dir:
+        indexPath, journalPath, headersPath = getDataPaths(args.data_dir)
+    else:
+        indexPath, headersPath = None, None
+        journalPath = os.path.join(
+            tempfile.gettempdir(), "merge_plugins_hide", "journal.json"
+        )
+
+    # Roll back renames of a hide / unhide that did not complete
+    recovered = RenameTransaction.recover(journalPath)
+    if recovered:
+        logger.warning(
+            "Rolled back %d renames of an interrupted transaction", recovered
+        )
+
+    pluginIndex = PluginIndex(indexPath)
+    pluginIndex.load()
+    headerCache = PluginHeaderCache(headersPath)
+    headerCache.load()
+    hider = PluginHider(
+        args.hide_type, pluginIndex, journalPath, headerCache=headerCache
+    )
+    for name, enabled in readModList(args.profile):
+        modPath = os.path.join(args.mods, name)
+        if not os.path.isdir(modPath):
+            continue
+        hider.addMod(modPath, name, enabled, enabled or args.all_mods, enabled)
+    hider.addMod(args.overwrite, None, True, True, False)
+    hider.scan()
+    pluginIndex.save()
+
+    patterns = [pattern.lower() for pattern in args.patterns] or ["*"]
+    modNames = sorted(
+        modName
+        for modName in hider.getMergedModNames()
+        if any(fnmatch.fnmatchcase(modName.lower(), pattern) for pattern in patterns)
+    )
+    states = hider.getMergedModsPluginsStates(modNames)
+
+    if args.command == "list":
+        dependents = hider.getMergedModsDependents(modNames)
+        headerCache.save()
+        result = [
+            {
+                "name": modName,
+                "state": ModPluginsState.NAMES[states[modName]],
+                "plugins": hider.getMergedModPlugins(modName),
+                "dependents": dependents[modName],
+            }
+            for modName in modNames
+        ]
+        lines = []
+        for mod in result:
+            lines.append("{}\t{}".format(mod["state"], mod["name"]))
+            lines += [
+                "\t{} masters hidden {}".format(plugin, master)
+                for plugin, master in mod["dependents"]
+            ]
+        success = True
+    else:
+        active = args.command == "unhide"
+        toChange = [ModPluginsState.INACTIVE if active else ModPluginsState.ACTIVE]
+        modNames = [
+            modName
+            for modName in modNames
+            if states[modName] in toChange + [ModPluginsState.MIXED]
+        ]
+        success, outcomes, _, _ = hider.setMergedModsPluginsActive(modNames, active)
+        result = {"success": success, "mods": modNames, "renames": outcomes}
+        lines = [
+            "{}: {} -> {} {}".format(
+                outcome["status"],
+                outcome["source"],
+                outcome["target"],
+                outcome["error"],
+            ).rstrip()
+            for outcome in outcomes
+        ]
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for line in lines:
+            print(line)
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,9 @@
 import os
-import glob
-import shutil
-import datetime
+import json
 
 import mobase  # type: ignore
-from . import common as Dc
+from . import sync_mod_order_backups as Sb
+from . import sync_mod_order_engine as Se
 
 import PyQt6.QtGui as QtGui  # type: ignore
 
@@ -19,22 +18,120 @@ qtUserRole = Qt.ItemDataRole.UserRole
 qtScrollBarAlwaysOff = Qt.ScrollBarPolicy.ScrollBarAlwaysOff
 qtCustomContextMenu = Qt.ContextMenuPolicy.CustomContextMenu
 qtWindowContextHelpButtonHint = Qt.WindowType.WindowContextHelpButtonHint
+QAbstractItemViewExtendedSelection = (
+    QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection
+)
 
-from PyQt6.QtCore import qDebug, qCritical  # type: ignore
+from PyQt6.QtCore import qDebug, qWarning, qCritical  # type: ignore
 
-from PyQt6.QtCore import QCoreApplication  # type: ignore
+from PyQt6.QtCore import QCoreApplication, QThread, QTimer, pyqtSignal  # type: ignore
+
+
+class DiffWorker(QThread):
+    """Compares the mod list of each profile with the current profile."""
+
+    result_signal = pyqtSignal(str, dict)
+
+    def __init__(self, profileIndex, modListInfo, profilePaths, parent=None):
+        super(DiffWorker, self).__init__(parent)
+        self.__is_running = True
+        self.__profileIndex = profileIndex
+        self.__modListInfo = modListInfo
+        self.__profilePaths = profilePaths
+
+    def run(self):
+        for profileName, profilePath in self.__profilePaths.items():
+            if not self.__is_running:
+                break
+            try:
+                _, modListInfo = self.__profileIndex.getList(
+                    os.path.join(profilePath, "modlist.txt")
+                )
+                self.result_signal.emit(
+                    profileName, Se.getModListDiff(self.__modListInfo, modListInfo)
+                )
+            except Exception as e:
+                qWarning(
+                    "Could not compare {}: {}".format(profileName, str(e)).encode(
+                        "utf-8"
+                    )
+                )
+
+    def stop(self):
+        self.__is_running = False
+
+
+class SyncWorker(QThread):
+    """Syncs the lists of a source profile to other profiles in the background."""
+
+    result_signal = pyqtSignal(list, list)
+
+    def __init__(self, syncer, sourcePath, filenames, profilePaths, parent=None):
+        super(SyncWorker, self).__init__(parent)
+        self.__syncer = syncer
+        self.__sourcePath = sourcePath
+        self.__filenames = filenames
+        self.__profilePaths = profilePaths
+
+    def run(self):
+        try:
+            self.__syncer.setSource(self.__sourcePath, self.__filenames)
+            changed, failed = self.__syncer.syncProfiles(self.__profilePaths)
+        except Exception as e:
+            qCritical(str(e).encode("utf-8"))
+            changed, failed = {}, self.__profilePaths
+        self.result_signal.emit(sorted(changed), sorted(failed))
+
+
+def getSyncedFiles(organizer, pluginName):
+    """Return the profile files to sync, depending on the settings."""
+    if organizer.pluginSetting(pluginName, "sync-load-order"):
+        return ["modlist.txt"] + Se.loadOrderFiles
+    return ["modlist.txt"]
+
+
+def getSubscriptions(organizer, pluginName):
+    """Return {profile name: [names of the profiles subscribed to it]}."""
+    try:
+        return json.loads(organizer.persistent(pluginName, "subscriptions", "") or "{}")
+    except ValueError:
+        return {}
+
+
+def setSubscriptions(organizer, pluginName, subscriptions):
+    organizer.setPersistent(
+        pluginName,
+        "subscriptions",
+        json.dumps(
+            {
+                profileName: subscribed
+                for profileName, subscribed in subscriptions.items()
+                if subscribed
+            }
+        ),
+    )
 
 
 class PluginWindow(QtWidgets.QDialog):
     def __tr(self, str):
         return QCoreApplication.translate("SyncModOrderWindow", str)
 
-    def __init__(self, organizer, parent=None):
+    def __init__(self, organizer, parent=None, profileIndex=None):
         self.__modListInfo = {}
         self.__profilesInfo = {}
+        self.__profileItems = {}
+        self.__diffWorker = None
         self.__organizer = organizer
+        self.__profileIndex = profileIndex or Se.ProfileIndex()
+        self.__tool = parent
+        self.__pluginName = parent.name()
+        self.__changedProfiles = set()
+        self.__subscribedProfiles = set()
+
+        super(PluginWindow, self).__init__(None)
 
-        super(PluginWindow, self).__init__(parent)
+        self.__backupStore = parent.getBackupStore()
+        self.__syncer = Se.ProfileSyncer(self.__profileIndex, self.__backupStore)
 
         self.resize(500, 500)
         self.setWindowIcon(QtGui.QIcon(":/deorder/sync_mod_order"))
@@ -46,15 +143,20 @@ class PluginWindow(QtWidgets.QDialog):
         # Vertical Layout -> Merged Mod List (TODO: Better to use QTreeView and model?)
         self.profileList = QtWidgets.QTreeWidget()
 
-        self.profileList.setColumnCount(1)
+        self.profileList.setColumnCount(5)
         self.profileList.setRootIsDecorated(False)
 
         self.profileList.header().setVisible(True)
         self.profileList.headerItem().setText(0, self.__tr("Profile name"))
+        self.profileList.headerItem().setText(1, self.__tr("To move"))
+        self.profileList.headerItem().setText(2, self.__tr("Not in current"))
+        self.profileList.headerItem().setText(3, self.__tr("Not in profile"))
+        self.profileList.headerItem().setText(4, self.__tr("Auto-sync"))
 
         self.profileList.setContextMenuPolicy(qtCustomContextMenu)
         self.profileList.setHorizontalScrollBarPolicy(qtScrollBarAlwaysOff)
         self.profileList.customContextMenuRequested.connect(self.openProfileMenu)
+        self.profileList.setSelectionMode(QAbstractItemViewExtendedSelection)
 
         verticalLayout.addWidget(self.profileList)
 
@@ -64,7 +166,7 @@ class PluginWindow(QtWidgets.QDialog):
         # Vertical Layout -> Button Layout -> Refresh Button
         refreshButton = QtWidgets.QPushButton(self.__tr("&Refresh"), self)
         refreshButton.setIcon(QtGui.QIcon(":/MO/gui/refresh"))
-        refreshButton.clicked.connect(self.refreshProfileList)
+        refreshButton.clicked.connect(self.rescanProfiles)
         buttonLayout.addWidget(refreshButton)
 
         # Vertical Layout -> Button Layout -> Close Button
@@ -77,53 +179,114 @@ class PluginWindow(QtWidgets.QDialog):
         # Vertical Layout
         self.setLayout(verticalLayout)
 
+        self.rescanProfiles()
+
+    def rescanProfiles(self):
         # Build lookup dictionary of all profiles
         self.__profileInfo = self.getProfileInfo()
 
-        # Build lookup dictionary of mods in current profile
-        self.__modListInfo = self.getModListInfoByPath(
-            os.path.join(self.__organizer.profilePath(), "modlist.txt")
+        # Build lookup dictionaries of the lists to sync of the current profile
+        self.__syncer.setSource(
+            self.__organizer.profilePath(),
+            getSyncedFiles(self.__organizer, self.__pluginName),
         )
+        self.__modListInfo = self.__syncer.getListInfo("modlist.txt")
 
-        self.refreshProfileList()
+        self.__subscribedProfiles = set(
+            getSubscriptions(self.__organizer, self.__pluginName).get(
+                self.__organizer.profileName(), []
+            )
+        )
 
-    def getModListInfoByPath(self, path):
-        modListInfo = {}
-        modListLines = Dc.readLines(path)
-        for index, modListLine in enumerate(modListLines):
-            modName = modListLine[1:]
-            modStateSymbol = modListLine[0]
-            modListInfo[modName] = {
-                "index": index,
-                "name": modName,
-                "symbol": modStateSymbol,
-            }
-        return modListInfo
+        self.refreshProfileList()
 
     def getProfileInfo(self):
         profileInfo = {}
-        for path in glob.glob(
-            os.path.join(
-                Dc.globEscape(self.__organizer.profilePath()),
-                os.pardir,
-                "*",
-                "modlist.txt",
-                os.pardir,
-            )
-        ):
-            profilePath = os.path.normpath(path)
-            profileName = os.path.basename(profilePath)
+        profilesPath = os.path.dirname(os.path.normpath(self.__organizer.profilePath()))
+        for profileName, profilePath in self.__profileIndex.getProfiles(
+            profilesPath
+        ).items():
             profileInfo[profileName] = {"name": profileName, "path": profilePath}
         return profileInfo
 
+    def syncProfiles(self, profileNames):
+        """Sync all given profiles in parallel, returns the failed profiles."""
+        changed, failed = self.__syncer.syncProfiles(
+            {
+                profileName: self.__profileInfo[profileName]["path"]
+                for profileName in profileNames
+            }
+        )
+        self.__changedProfiles |= set(changed)
+        return failed
+
+    def setProfilesSubscribed(self, profileNames, subscribed):
+        """Subscribe profiles to, or unsubscribe from, the current profile."""
+        if subscribed:
+            self.__subscribedProfiles |= set(profileNames)
+        else:
+            self.__subscribedProfiles -= set(profileNames)
+        subscriptions = getSubscriptions(self.__organizer, self.__pluginName)
+        subscriptions[self.__organizer.profileName()] = sorted(
+            self.__subscribedProfiles
+        )
+        setSubscriptions(self.__organizer, self.__pluginName, subscriptions)
+        for profileName in profileNames:
+            item = self.__profileItems.get(profileName)
+            if item is not None:
+                item.setText(4, self.__tr("Yes") if subscribed else "")
+
+    def hasChangedProfiles(self):
+        """Whether a mod list was written since the dialog was opened."""
+        return bool(self.__changedProfiles)
+
+    def hasChangedCurrentProfile(self):
+        """Whether a backup was restored into the current profile."""
+        return self.__organizer.profileName() in self.__changedProfiles
+
     def refreshProfileList(self):
+        self.stopDiffWorker()
         self.profileList.clear()
+        self.__profileItems = {}
         for profileName in sorted(self.__profileInfo):
             item = QtWidgets.QTreeWidgetItem(self.profileList, [profileName])
+            if profileName in self.__subscribedProfiles:
+                item.setText(4, self.__tr("Yes"))
             item.setData(0, qtUserRole, {"profileName": profileName})
             self.profileList.addTopLevelItem(item)
+            self.__profileItems[profileName] = item
         self.profileList.resizeColumnToContents(0)
 
+        # Differences are filled in as they are computed
+        self.__diffWorker = DiffWorker(
+            self.__profileIndex,
+            self.__modListInfo,
+            {
+                profileName: profileInfo["path"]
+                for profileName, profileInfo in sorted(self.__profileInfo.items())
+            },
+            self,
+        )
+        self.__diffWorker.result_signal.connect(self.onProfileCompared)
+        self.__diffWorker.start()
+
+    def onProfileCompared(self, profileName, diff):
+        item = self.__profileItems.get(profileName)
+        if item is not None:
+            item.setText(1, str(diff["moved"]))
+            item.setText(2, str(diff["missingHere"]))
+            item.setText(3, str(diff["missingThere"]))
+
+    def stopDiffWorker(self):
+        if self.__diffWorker:
+            self.__diffWorker.stop()
+            self.__diffWorker.wait()
+            self.__diffWorker = None
+
+    def done(self, result):
+        self.stopDiffWorker()
+        super(PluginWindow, self).done(result)
+
     def openProfileMenu(self, position):
         selectedItems = self.profileList.selectedItems()
         if selectedItems:
@@ -137,48 +300,90 @@ class PluginWindow(QtWidgets.QDialog):
 
             syncAction = QAction(
                 QtGui.QIcon(":/MO/gui/next"),
-                self.__tr("&Sync current profile mod order to"),
+                self.__tr("&Sync current profile order to"),
                 self,
             )
-            syncAction.setEnabled(True)
+            # Profiles are not written by hand while the auto-sync writes them
+            syncing = self.__tool.isSyncing()
+            if syncing:
+                syncAction.setText(
+                    self.__tr("&Sync current profile order to (auto-sync running)")
+                )
+            syncAction.setEnabled(not syncing)
             menu.addAction(syncAction)
 
+            # Subscribed profiles are synced whenever the current order changes
+            subscribeAction = QAction(
+                self.__tr("&Auto-sync from current profile"),
+                self,
+            )
+            subscribeAction.setCheckable(True)
+            subscribeAction.setChecked(
+                all(
+                    profileName in self.__subscribedProfiles
+                    for profileName in selectedProfiles
+                )
+            )
+            menu.addAction(subscribeAction)
+
+            # Backups can only be restored one profile at a time
+            restoreMenu = menu.addMenu(self.__tr("&Restore backup"))
+            restoreActions = {}
+            if len(selectedProfiles) == 1:
+                try:
+                    for backup in reversed(
+                        self.__backupStore.load(selectedProfiles[0])
+                    ):
+                        restoreAction = restoreMenu.addAction(
+                            "{} ({})".format(backup["time"], backup["file"])
+                        )
+                        restoreActions[restoreAction] = backup
+                except Exception as e:
+                    qCritical(str(e).encode("utf-8"))
+            restoreMenu.setEnabled(bool(restoreActions) and not syncing)
+
             action = menu.exec(self.profileList.mapToGlobal(position))
 
             try:
                 if action == syncAction:
-                    for profileName in selectedProfiles:
-                        profileInfo = self.__profileInfo[profileName]
-                        modListPath = os.path.join(profileInfo["path"], "modlist.txt")
-                        modListBackupPath = (
-                            modListPath
-                            + "."
-                            + datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+                    failed = self.syncProfiles(selectedProfiles)
+                    self.refreshProfileList()
+                    if failed:
+                        QtWidgets.QMessageBox.warning(
+                            self,
+                            self.__tr("Sync Mod Order"),
+                            self.__tr("Could not sync {} of {} profiles:\n{}").format(
+                                len(failed),
+                                len(selectedProfiles),
+                                "\n".join(
+                                    "{}: {}".format(profileName, failed[profileName])
+                                    for profileName in sorted(failed)
+                                ),
+                            ),
                         )
 
-                        qDebug(self.__tr("Backing up to {}").format(modListBackupPath))
-                        shutil.copy(modListPath, modListBackupPath)
-
-                        selectedModListInfo = self.getModListInfoByPath(modListPath)
-                        mergedModListInfo = dict(
-                            self.__modListInfo, **selectedModListInfo
+                if action == subscribeAction:
+                    self.setProfilesSubscribed(
+                        selectedProfiles, subscribeAction.isChecked()
+                    )
+
+                if action in restoreActions:
+                    backup = restoreActions[action]
+                    profileInfo = self.__profileInfo[selectedProfiles[0]]
+                    self.__backupStore.restore(
+                        selectedProfiles[0],
+                        backup["id"],
+                        os.path.join(profileInfo["path"], backup["file"]),
+                        backup["file"],
+                    )
+                    self.__changedProfiles.add(selectedProfiles[0])
+                    # The differences are against the restored order now
+                    if selectedProfiles[0] == self.__organizer.profileName():
+                        self.__syncer.setSource(
+                            self.__organizer.profilePath(),
+                            getSyncedFiles(self.__organizer, self.__pluginName),
                         )
-
-                        for modName in list(self.__modListInfo.keys()):
-                            mergedModListInfo[modName]["index"] = self.__modListInfo[
-                                modName
-                            ]["index"]
-
-                        qDebug(self.__tr("Updating {} mod order").format(modListPath))
-                        with open(modListPath, "w", encoding="utf-8") as modListFile:
-                            for modName, modListEntry in sorted(
-                                list(mergedModListInfo.items()),
-                                key=lambda x: x[1]["index"],
-                            ):
-                                modListFile.write(
-                                    modListEntry["symbol"] + modListEntry["name"] + "\n"
-                                )
-
+                        self.__modListInfo = self.__syncer.getListInfo("modlist.txt")
                     self.refreshProfileList()
             except Exception as e:
                 qCritical(str(e).encode("utf-8"))
@@ -199,6 +404,12 @@ class PluginTool(mobase.IPluginTool):
         self.__window = None
         self.__organizer = None
         self.__parentWidget = None
+        self.__syncTimer = None
+        self.__syncWorker = None
+        self.__syncPending = False
+        self.__backupStore = None
+        # Kept between dialogs so unchanged mod lists are not parsed again
+        self.__profileIndex = Se.ProfileIndex()
 
         super(PluginTool, self).__init__()
 
@@ -206,18 +417,127 @@ class PluginTool(mobase.IPluginTool):
         from . import resources  # noqa
 
         self.__organizer = organizer
+
+        # Order changes are synced to subscribed profiles in batches, once
+        # the order has not changed for a while. This also leaves MO2 time to
+        # write the changed lists of the current profile.
+        self.__syncTimer = QTimer()
+        self.__syncTimer.setSingleShot(True)
+        self.__syncTimer.setInterval(2000)
+        self.__syncTimer.timeout.connect(self.onSyncTimeout)
+        organizer.modList().onModMoved(lambda *args: self.scheduleSync())
+        organizer.modList().onModInstalled(lambda *args: self.scheduleSync())
+        organizer.pluginList().onPluginMoved(lambda *args: self.scheduleSync())
         return True
 
+    def scheduleSync(self):
+        if not self.__organizer.pluginSetting(self.name(), "enabled"):
+            return
+        if getSubscriptions(self.__organizer, self.name()).get(
+            self.__organizer.profileName()
+        ):
+            self.__syncTimer.start()
+
+    def getBackupStore(self):
+        """Return the backup store shared by the dialog and the auto-sync."""
+        if self.__backupStore is None:
+            self.__backupStore = Sb.BackupStore(
+                Sb.getBackupsPath(self.__organizer.getPluginDataPath())
+            )
+        self.__backupStore.keepLast = self.__organizer.pluginSetting(
+            self.name(), "backup-keep-last"
+        )
+        self.__backupStore.keepDaily = self.__organizer.pluginSetting(
+            self.name(), "backup-keep-daily"
+        )
+        return self.__backupStore
+
+    def isSyncing(self):
+        return self.__syncWorker is not None and self.__syncWorker.isRunning()
+
+    def onSyncTimeout(self):
+        # Changes made during a sync or while the dialog is open are synced
+        # after it is done
+        if self.isSyncing() or (
+            self.__window is not None and self.__window.isVisible()
+        ):
+            self.__syncPending = True
+            return
+
+        profileName = self.__organizer.profileName()
+        subscribed = getSubscriptions(self.__organizer, self.name()).get(
+            profileName, []
+        )
+        profilesPath = os.path.dirname(os.path.normpath(self.__organizer.profilePath()))
+        profilePaths = {
+            name: path
+            for name, path in self.__profileIndex.getProfiles(profilesPath).items()
+            if name in subscribed and name != profileName
+        }
+        if not profilePaths:
+            return
+
+        self.__syncWorker = SyncWorker(
+            Se.ProfileSyncer(self.__profileIndex, self.getBackupStore()),
+            self.__organizer.profilePath(),
+            getSyncedFiles(self.__organizer, self.name()),
+            profilePaths,
+        )
+        self.__syncWorker.result_signal.connect(self.onSyncDone)
+        self.__syncWorker.start()
+
+    def onSyncDone(self, changed, failed):
+        if changed:
+            qDebug(
+                self.__tr("Auto-synced {}").format(", ".join(changed)).encode("utf-8")
+            )
+        if failed:
+            qWarning(
+                self.__tr("Could not auto-sync {}")
+                .format(", ".join(failed))
+                .encode("utf-8")
+            )
+        if self.__syncPending:
+            self.__syncPending = False
+            self.__syncTimer.start()
+
     def settings(self):
-        return [mobase.PluginSetting("enabled", self.__tr("Enable this plugin"), True)]
+        return [
+            mobase.PluginSetting("enabled", self.__tr("Enable this plugin"), True),
+            mobase.PluginSetting(
+                "sync-load-order",
+                self.__tr(
+                    "Also sync the plugin load order (plugins.txt/loadorder.txt)"
+                ),
+                True,
+            ),
+            mobase.PluginSetting(
+                "backup-keep-last",
+                self.__tr("Number of most recent backups to keep per profile"),
+                10,
+            ),
+            mobase.PluginSetting(
+                "backup-keep-daily",
+                self.__tr("Number of days to keep the last backup of each day"),
+                7,
+            ),
+        ]
 
     def display(self):
-        self.__window = PluginWindow(self.__organizer)
+        self.__window = PluginWindow(self.__organizer, self, self.__profileIndex)
         self.__window.setWindowTitle(self.NAME)
         self.__window.exec()
-
-        # Refresh Mod Organizer mod list to reflect changes
-        self.__organizer.refresh()
+        if self.__syncPending and not self.isSyncing():
+            self.__syncPending = False
+            self.__syncTimer.start()
+
+        # Refresh Mod Organizer mod list to reflect changes, the refresh is
+        # expensive so skip it when no mod list was written. A restored current
+        # profile is reloaded without saving, saving would overwrite it again
+        if self.__window.hasChangedCurrentProfile():
+            self.__organizer.refresh(False)
+        elif self.__window.hasChangedProfiles():
+            self.__organizer.refresh()
 
     def icon(self):
 
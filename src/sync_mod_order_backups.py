@@ -0,0 +1,228 @@
+"""Gzip backups of profile lists, stored once per content hash.
+
+python sync_mod_order_backups.py <backups dir> list "Some Profile"
+python sync_mod_order_backups.py <backups dir> restore "Some Profile" <id> <path>
+"""
+
+import os
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+import datetime
+import threading
+from typing import Dict, List, Optional, Set
+
+
+def writeBytesAtomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tempPath = path + ".tmp"
+    with open(tempPath, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tempPath, path)
+
+
+class BackupStore:
+    """Compressed backups of profile files, deduplicated by content hash.
+
+    A backup of content that equals the newest backup of the same file is
+    skipped. Retention keeps the newest keepLast backups of each profile
+    file, plus the newest backup of each of the last keepDaily days.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, keepLast: int = 10, keepDaily: int = 7) -> None:
+        self.path = path
+        self.keepLast = keepLast
+        self.keepDaily = keepDaily
+        self.__lock = threading.Lock()
+
+    def getObjectPath(self, digest: str) -> str:
+        return os.path.join(self.path, "objects", digest[:2], digest + ".gz")
+
+    def getProfilePath(self, profileName: str) -> str:
+        return os.path.join(self.path, "profiles", profileName + ".json")
+
+    def load(self, profileName: str) -> List[Dict[str, str]]:
+        """Return the backups of a profile, oldest first."""
+        try:
+            with open(self.getProfilePath(profileName), "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return []
+        if data.get("version") != self.VERSION:
+            raise ValueError(
+                "Unsupported backup list version {}".format(data.get("version"))
+            )
+        return data["backups"]
+
+    def save(self, profileName: str, backups: List[Dict[str, str]]) -> None:
+        data = {"version": self.VERSION, "backups": backups}
+        writeBytesAtomic(
+            self.getProfilePath(profileName), json.dumps(data).encode("utf-8")
+        )
+
+    def profiles(self) -> List[str]:
+        try:
+            names = os.listdir(os.path.join(self.path, "profiles"))
+        except FileNotFoundError:
+            return []
+        return sorted(name[: -len(".json")] for name in names if name.endswith(".json"))
+
+    def backup(self, profileName: str, path: str) -> Optional[Dict[str, str]]:
+        """Back up a profile file, returns the new backup or None if unchanged."""
+        with open(path, "rb") as file:
+            data = file.read()
+        digest = hashlib.sha256(data).hexdigest()
+        filename = os.path.basename(path)
+
+        with self.__lock:
+            backups = self.load(profileName)
+            for backup in reversed(backups):
+                if backup["file"] == filename:
+                    if backup["hash"] == digest:
+                        return None
+                    break
+
+            objectPath = self.getObjectPath(digest)
+            if not os.path.exists(objectPath):
+                writeBytesAtomic(objectPath, gzip.compress(data))
+
+            now = datetime.datetime.now()
+            backup = {
+                # Backups of several files can be made within one clock tick
+                "id": "{}-{}".format(now.strftime("%Y%m%d%H%M%S%f"), digest[:8]),
+                "time": now.isoformat(timespec="seconds"),
+                "file": filename,
+                "hash": digest,
+            }
+            backups.append(backup)
+            kept = self.retain(backups)
+            self.save(profileName, kept)
+            dropped = set(entry["hash"] for entry in backups) - set(
+                entry["hash"] for entry in kept
+            )
+            if dropped:
+                self.collect(dropped - self.hashes())
+        return backup
+
+    def retain(self, backups: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Apply the retention policy to the backups of each file."""
+        keep = set()  # (id, file)
+        files = set(backup["file"] for backup in backups)
+        today = datetime.date.today()
+        for filename in files:
+            fileBackups = [backup for backup in backups if backup["file"] == filename]
+            # fileBackups[-0:] would be all backups
+            if self.keepLast > 0:
+                keep |= set(
+                    (backup["id"], filename) for backup in fileBackups[-self.keepLast :]
+                )
+            days = set()
+            for backup in reversed(fileBackups):
+                day = backup["time"][:10]
+                age = (today - datetime.date.fromisoformat(day)).days
+                if age < self.keepDaily and day not in days:
+                    days.add(day)
+                    keep.add((backup["id"], filename))
+        return [backup for backup in backups if (backup["id"], backup["file"]) in keep]
+
+    def hashes(self) -> Set[str]:
+        """Return the hashes referenced by the backups of all profiles."""
+        return set(
+            backup["hash"]
+            for profileName in self.profiles()
+            for backup in self.load(profileName)
+        )
+
+    def collect(self, digests: Set[str]) -> None:
+        """Remove the objects of the given hashes, they must be unreferenced."""
+        for digest in digests:
+            try:
+                os.remove(self.getObjectPath(digest))
+            except FileNotFoundError:
+                pass
+
+    def read(self, backup: Dict[str, str]) -> bytes:
+        with open(self.getObjectPath(backup["hash"]), "rb") as file:
+            return gzip.decompress(file.read())
+
+    def find(self, profileName: str, backupId: str, filename: str) -> Dict[str, str]:
+        for backup in self.load(profileName):
+            if backup["id"] == backupId and backup["file"] == filename:
+                return backup
+        raise KeyError(
+            "No backup {} of {} of profile {}".format(backupId, filename, profileName)
+        )
+
+    def restore(
+        self,
+        profileName: str,
+        backupId: str,
+        path: str,
+        filename: Optional[str] = None,
+    ) -> None:
+        """Restore a backup to path, backing up the current file first.
+
+        The backup is looked up by id and file, which is the name of path
+        unless given.
+        """
+        backup = self.find(profileName, backupId, filename or os.path.basename(path))
+        data = self.read(backup)
+        if os.path.exists(path):
+            self.backup(profileName, path)
+        writeBytesAtomic(path, data)
+
+
+def getBackupsPath(dataPath: str) -> str:
+    return os.path.join(dataPath, "sync_mod_order", "backups")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="List and restore Sync Mod Order backups."
+    )
+    parser.add_argument("backups", help="Path to the backups directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    listParser = subparsers.add_parser("list", help="Backups of a profile")
+    listParser.add_argument("profile", nargs="?")
+    listParser.add_argument("--json", action="store_true", help="Output JSON")
+    restoreParser = subparsers.add_parser("restore", help="Restore a backup")
+    restoreParser.add_argument("profile")
+    restoreParser.add_argument("id")
+    restoreParser.add_argument("path", help="File to restore the backup to")
+    restoreParser.add_argument(
+        "--file", help="File name of the backup, defaults to the name of path"
+    )
+    args = parser.parse_args(argv)
+
+    store = BackupStore(args.backups)
+    if args.command == "restore":
+        store.restore(args.profile, args.id, args.path, args.file)
+        return 0
+
+    profileNames = [args.profile] if args.profile else store.profiles()
+    result = {
+        profileName: list(reversed(store.load(profileName)))
+        for profileName in profileNames
+    }
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for profileName, backups in result.items():
+            for backup in backups:
+                print(
+                    "{}\t{}\t{}\t{}".format(
+                        profileName, backup["id"], backup["time"], backup["file"]
+                    )
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+"""Parsing and merging of mod lists and load orders across profiles.
+
+python sync_mod_order_engine.py <source profile> <target profile>... --dry-run
+"""
+
+import os
+import sys
+import json
+import bisect
+import logging
+import argparse
+import threading
+import multiprocessing
+import concurrent.futures
+
+try:
+    from . import sync_mod_order_backups as Sb
+except ImportError:
+    import sync_mod_order_backups as Sb
+
+logger = logging.getLogger(__name__)
+
+
+def readLines(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return [line.strip() for line in file.readlines()]
+
+
+def writeLinesAtomic(path, lines):
+    """Write lines to a temp file first and replace the file with it.
+
+    The temp file is synced once after all lines are written, so a crash
+    leaves either the old or the new file but never a truncated one.
+    """
+    # Per thread, so concurrent writes of a file do not share a temp file
+    tempPath = "{}.{}-{}.tmp".format(path, os.getpid(), threading.get_ident())
+    with open(tempPath, "w", encoding="utf-8") as file:
+        file.writelines(line + "\n" for line in lines)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tempPath, path)
+
+
+def parseModList(modListLines):
+    modListInfo = {}
+    for index, modListLine in enumerate(modListLines):
+        modName = modListLine[1:]
+        modStateSymbol = modListLine[0]
+        modListInfo[modName] = {
+            "index": index,
+            "name": modName,
+            "symbol": modStateSymbol,
+        }
+    return modListInfo
+
+
+def parsePluginList(pluginListLines):
+    """Parse a plugins.txt or loadorder.txt, enabled plugins are marked by *."""
+    pluginListInfo = {}
+    for index, pluginListLine in enumerate(pluginListLines):
+        if not pluginListLine:
+            continue
+        pluginStateSymbol = pluginListLine[0] if pluginListLine[0] in "*#" else ""
+        pluginName = pluginListLine[len(pluginStateSymbol) :]
+        pluginListInfo[pluginName] = {
+            "index": index,
+            "name": pluginName,
+            "symbol": pluginStateSymbol,
+        }
+    return pluginListInfo
+
+
+# The profile files that are synced and how they are parsed
+listParsers = {
+    "modlist.txt": parseModList,
+    "plugins.txt": parsePluginList,
+    "loadorder.txt": parsePluginList,
+}
+loadOrderFiles = ["plugins.txt", "loadorder.txt"]
+
+
+def mergeListInfo(listInfo, selectedListInfo, addMissing=True):
+    """Merge a profile's list into the order of the current profile's list.
+
+    Entries keep the state symbol of the selected profile, entries that are
+    in both lists are put in the order of the current profile. Entries that
+    are only in the selected profile stay right after the entry in both
+    lists that they follow, so merging the result again changes nothing.
+    Entries only in the current list are added when addMissing is set.
+    Returns the lines.
+    """
+    # Group the entries only in the selected list by the entry they follow
+    following = {}
+    anchor = None
+    for listEntry in sorted(selectedListInfo.values(), key=lambda x: x["index"]):
+        if listEntry["name"] in listInfo:
+            anchor = listEntry["name"]
+        else:
+            following.setdefault(anchor, []).append(listEntry)
+
+    mergedListEntries = list(following.get(None, []))
+    for listEntry in sorted(listInfo.values(), key=lambda x: x["index"]):
+        selectedListEntry = selectedListInfo.get(listEntry["name"])
+        if selectedListEntry is not None:
+            mergedListEntries.append(selectedListEntry)
+        elif addMissing:
+            mergedListEntries.append(listEntry)
+        mergedListEntries += following.get(listEntry["name"], [])
+    return [listEntry["symbol"] + listEntry["name"] for listEntry in mergedListEntries]
+
+
+def getModListDiff(modListInfo, otherModListInfo):
+    """Summarize how another mod list differs from a mod list.
+
+    moved is the least number of mods that have to move to get the mods in
+    both lists in the same order, missingHere and missingThere count the
+    mods that are only in the other list and only in this list.
+    """
+    mods = set(name for name, entry in modListInfo.items() if entry["symbol"] != "#")
+    otherMods = set(
+        name for name, entry in otherModListInfo.items() if entry["symbol"] != "#"
+    )
+    common = sorted(mods & otherMods, key=lambda name: modListInfo[name]["index"])
+
+    # Mods on the longest run that is already in order can stay in place
+    tails = []
+    for name in common:
+        index = otherModListInfo[name]["index"]
+        position = bisect.bisect_left(tails, index)
+        if position == len(tails):
+            tails.append(index)
+        else:
+            tails[position] = index
+
+    return {
+        "moved": len(common) - len(tails),
+        "missingHere": len(otherMods - mods),
+        "missingThere": len(mods - otherMods),
+    }
+
+
+class ProfileIndex:
+    """Parsed mod lists of profiles, reparsed when their mtime or size changed.
+
+    Safe to use from multiple threads. The returned mod list info is shared
+    and must not be modified.
+    """
+
+    def __init__(self):
+        self.__modLists = {}
+        self.__lock = threading.Lock()
+
+    def getProfiles(self, profilesPath):
+        """Return {name: path} of the profiles with a mod list."""
+        profiles = {}
+        with os.scandir(profilesPath) as entries:
+            for entry in entries:
+                if entry.is_dir() and os.path.isfile(
+                    os.path.join(entry.path, "modlist.txt")
+                ):
+                    profiles[entry.name] = os.path.normpath(entry.path)
+        return profiles
+
+    def getList(self, path):
+        """Return (lines, list info) of a mod list or plugin list."""
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.__lock:
+            cached = self.__modLists.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1], cached[2]
+        listLines = readLines(path)
+        listInfo = listParsers[os.path.basename(path).lower()](listLines)
+        with self.__lock:
+            self.__modLists[path] = (key, listLines, listInfo)
+        return listLines, listInfo
+
+
+class ProfileSyncer:
+    """Syncs the lists of a source profile to other profiles.
+
+    The source lists are read by setSource, after that profiles can be
+    synced concurrently.
+    """
+
+    def __init__(self, profileIndex, backupStore, maxWorkers=None):
+        self.__profileIndex = profileIndex
+        self.__backupStore = backupStore
+        self.__maxWorkers = maxWorkers or min(8, max(1, multiprocessing.cpu_count()))
+        self.__listInfo = {}
+
+    def setSource(self, profilePath, filenames):
+        """Read the lists of the source profile, missing load orders are skipped."""
+        listInfo = {}
+        for filename in filenames:
+            path = os.path.join(profilePath, filename)
+            if filename == "modlist.txt" or os.path.isfile(path):
+                listInfo[filename] = self.__profileIndex.getList(path)[1]
+        self.__listInfo = listInfo
+
+    def getListInfo(self, filename):
+        return self.__listInfo.get(filename, {})
+
+    def syncProfile(self, profileName, profilePath, dryRun=False):
+        """Sync the source mod order and load order to a profile.
+
+        Returns the names of the changed lists, lists that are already in
+        order are not backed up or written. With dryRun nothing is written.
+        """
+        changed = []
+        for filename, listInfo in self.__listInfo.items():
+            path = os.path.join(profilePath, filename)
+            # Only sync the load order to profiles that have one
+            if filename != "modlist.txt" and not os.path.isfile(path):
+                continue
+            listLines, selectedListInfo = self.__profileIndex.getList(path)
+
+            # Plugins are only reordered, adding the current profile's
+            # plugins would enable them in plugins.txt of some games
+            mergedListLines = mergeListInfo(
+                listInfo, selectedListInfo, filename not in loadOrderFiles
+            )
+            if mergedListLines == listLines:
+                logger.debug("%s order is unchanged", path)
+                continue
+            changed.append(filename)
+            if dryRun:
+                continue
+
+            if self.__backupStore is not None:
+                logger.debug("Backing up %s", path)
+                self.__backupStore.backup(profileName, path)
+
+            logger.debug("Updating %s order", path)
+            writeLinesAtomic(path, mergedListLines)
+        return changed
+
+    def syncProfiles(self, profilePaths, dryRun=False):
+        """Sync profiles {name: path} in parallel.
+
+        Returns ({name: changed lists} of the changed profiles, {name:
+        exception} of the profiles that could not be synced).
+        """
+        changed = {}
+        failed = {}
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.__maxWorkers
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self.syncProfile, profileName, profilePath, dryRun
+                ): profileName
+                for profileName, profilePath in profilePaths.items()
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    changedLists = future.result()
+                    if changedLists:
+                        changed[futures[future]] = changedLists
+                except Exception as e:
+                    failed[futures[future]] = e
+                    logger.error("Could not sync %s: %s", futures[future], e)
+        return changed, failed
+
+
+def getModListInfoByPath(path):
+    return parseModList(readLines(path))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sync the mod order and load order of a profile to other "
+        "profiles while keeping their enabled/disabled states."
+    )
+    parser.add_argument("source", help="Profile directory to sync the order from")
+    parser.add_argument(
+        "targets", nargs="+", metavar="target", help="Profile directories to sync to"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report the profiles and lists that would change",
+    )
+    parser.add_argument(
+        "--no-load-order",
+        action="store_true",
+        help="Only sync modlist.txt, not plugins.txt / loadorder.txt",
+    )
+    parser.add_argument(
+        "--backups",
+        help="Backups directory, <MO2 plugin data>/sync_mod_order/backups to "
+        "share the backups with the plugin",
+    )
+    parser.add_argument("--json", action="store_true", help="Output JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    filenames = ["modlist.txt"] + ([] if args.no_load_order else loadOrderFiles)
+    profileIndex = ProfileIndex()
+    syncer = ProfileSyncer(
+        profileIndex, Sb.BackupStore(args.backups) if args.backups else None
+    )
+    syncer.setSource(args.source, filenames)
+
+    profilePaths = {
+        os.path.basename(os.path.normpath(target)): os.path.normpath(target)
+        for target in args.targets
+    }
+    diffs = {}
+    for profileName, profilePath in profilePaths.items():
+        try:
+            _, modListInfo = profileIndex.getList(
+                os.path.join(profilePath, "modlist.txt")
+            )
+            diffs[profileName] = getModListDiff(
+                syncer.getListInfo("modlist.txt"), modListInfo
+            )
+        except OSError:
+            diffs[profileName] = None
+    changed, failed = syncer.syncProfiles(profilePaths, args.dry_run)
+
+    result = [
+        {
+            "name": profileName,
+            "path": profilePath,
+            "diff": diffs[profileName],
+            "changed": changed.get(profileName, []),
+            "error": str(failed[profileName]) if profileName in failed else None,
+        }
+        for profileName, profilePath in profilePaths.items()
+    ]
+    if args.json:
+        json.dump({"dryRun": args.dry_run, "profiles": result}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for profile in result:
+            if profile["error"]:
+                status = "error: " + profile["error"]
+            elif profile["changed"]:
+                status = ", ".join(profile["changed"])
+            else:
+                status = "unchanged"
+            print("{}\t{}".format(profile["name"], status))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())